@@ -0,0 +1,53 @@
+"""
+导入耗时基准：在新的解释器中分别导入各功能的入口，统计耗时、内存峰值以及加载了哪些较重的依赖库
+用法（在backend目录下）：python benchmarks/import_time.py [--repeat 3]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+# 场景 -> 导入的模块
+SCENARIOS = {
+    "main": ["main"],
+    "governance": ["collarboration.governance_analyzer"],
+    "health": ["health.health_analyzer"],
+    "skills": ["skills.developer_analyzer"],
+}
+HEAVY_MODULES = ["torch", "transformers", "matplotlib", "wordcloud", "plotly.graph_objects", "pandas", "pyarrow", "numpy", "github"]
+
+CHILD = """
+import sys, time, json, resource, importlib
+start = time.perf_counter()
+for module in {modules!r}:
+    importlib.import_module(module)
+seconds = time.perf_counter() - start
+rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"seconds": seconds, "maxrss_kb": rss, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+def measure(modules: list[str]) -> dict:
+    code = CHILD.format(modules=modules, heavy=HEAVY_MODULES)
+    env = dict(os.environ)
+    env.setdefault("GITHUB_TOKEN", "benchmark")  # config需要，导入时不访问github
+    out = subprocess.run([sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="统计各功能入口的导入耗时和内存")
+    parser.add_argument("--repeat", type=int, default=3, help="每个场景重复次数，取中位数")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), help=f"场景：{', '.join(SCENARIOS)}")
+    args = parser.parse_args()
+
+    print(f"{'scenario':<12}{'seconds':>10}{'maxrss(MB)':>12}  heavy modules")
+    for name in args.scenarios:
+        runs = [measure(SCENARIOS[name]) for _ in range(args.repeat)]
+        seconds = statistics.median(r["seconds"] for r in runs)
+        rss = statistics.median(r["maxrss_kb"] for r in runs) / 1024
+        print(f"{name:<12}{seconds:>10.3f}{rss:>12.1f}  {', '.join(runs[-1]['heavy']) or '-'}")
@@ -12,8 +12,57 @@ if not GITHUB_TOKEN:
 OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+# 分析截止时间，也是结果缓存和ETag的一部分；未设置时取当天0点，同一天启动的各worker进程（及重启后）共享缓存和ETag
 NOWDATE = os.getenv("NOWDATE")
 if not NOWDATE:
-    NOWDATE = datetime.now().replace(tzinfo=timezone.utc)
+    NOWDATE = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=timezone.utc)
 else:
     NOWDATE = datetime.fromisoformat(NOWDATE).replace(tzinfo=timezone.utc)
+
+# 结果缓存：RESULT_CACHE_DIR 为空时只使用进程内缓存；网络数据（release、dependents）的缓存时间（秒）
+RESULT_CACHE_DIR = os.getenv("RESULT_CACHE_DIR")
+NETWORK_CACHE_TTL = int(os.getenv("NETWORK_CACHE_TTL", 6 * 3600))
+
+# 调试用：将开发者分析的输入数据保存到临时目录 SCRATCH_DIR/{github_user}_{uuid4}/ 下
+SKILLS_SNAPSHOT = os.getenv("SKILLS_SNAPSHOT", "").lower() in ("1", "true", "yes")
+
+# 单次请求的临时目录，超过大小（字节）或时间（秒）限制后自动清理；cache/ 下其余为长期保存的预计算结果
+SCRATCH_DIR = os.getenv("SCRATCH_DIR", "cache/scratch")
+SCRATCH_MAX_BYTES = int(os.getenv("SCRATCH_MAX_BYTES", 1024 ** 3))
+SCRATCH_MAX_AGE = int(os.getenv("SCRATCH_MAX_AGE", 24 * 3600))
+
+# 按内容寻址保存的图片文件（/artifacts/），超过大小（字节）或时间（秒）限制后自动清理
+ARTIFACT_DIR = os.getenv("ARTIFACT_DIR", "cache/artifacts")
+ARTIFACT_MAX_BYTES = int(os.getenv("ARTIFACT_MAX_BYTES", 1024 ** 3))
+ARTIFACT_MAX_AGE = int(os.getenv("ARTIFACT_MAX_AGE", 7 * 24 * 3600))
+
+# 启动时预热的功能（skills：开发者分析，health：健康度分析），为空或0时不预热；完成前 /ready 返回503
+WARMUP = [f for f in os.getenv("WARMUP", "skills,health").replace(" ", "").split(",") if f and f != "0"]
+
+# 后台分析任务：并发数、最多排队数、完成后保留时间（秒）
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", 64))
+JOB_TTL = int(os.getenv("JOB_TTL", 3600))
+# 任务状态和结果的目录，多个worker进程共享（轮询可能由任意worker处理）；批量任务单独的并发数
+JOB_DIR = os.getenv("JOB_DIR", "cache/jobs")
+BATCH_JOB_WORKERS = int(os.getenv("BATCH_JOB_WORKERS", 1))
+
+# 性能分析（需另行 pip install pyinstrument）：按比例抽样请求，或 PROFILE_HEADER 开启时分析带 X-Profile 头的请求；
+# 结果保存在 PROFILE_DIR，超过大小（字节）或时间（秒）限制后自动清理
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "").lower() in ("1", "true", "yes")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "cache/profiles")
+PROFILE_MAX_BYTES = int(os.getenv("PROFILE_MAX_BYTES", 256 * 1024 ** 2))
+PROFILE_MAX_AGE = int(os.getenv("PROFILE_MAX_AGE", 7 * 24 * 3600))
+
+# 批量开发者分析（skills.batch）：进程数，以及通过接口提交时结果文件的目录
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", os.cpu_count() or 1))
+BATCH_DIR = os.getenv("BATCH_DIR", "cache/batch")
+
+# 仓库的本地镜像（不含文件内容的bare clone），更新commit数据时只fetch并解析上次之后的新commit
+MIRROR_DIR = os.getenv("MIRROR_DIR", "cache/mirrors")
+
+# 采集commit时 git邮箱 -> github login 的缓存（json文件），已知邮箱的commit不再请求github
+EMAIL_LOGIN_CACHE = os.getenv("EMAIL_LOGIN_CACHE", "cache/email_logins.json")
+# 没有关联github用户的邮箱的缓存时间（秒），过期后重新查询
+EMAIL_UNLINKED_TTL = int(os.getenv("EMAIL_UNLINKED_TTL", 7 * 24 * 3600))
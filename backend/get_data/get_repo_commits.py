@@ -1,216 +1,284 @@
+import os
 import time
 # import requests
 import json
+import tempfile
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import subprocess
 import logging
 from typing import *
-from github import Github
 
-from utils.request_github import request_github
+from utils.request_github import request_github, request_graphql, GraphQLError
+from utils import dataset, git_mirror
+from get_data.get_repo_issues import write_json_list
+from config import EMAIL_LOGIN_CACHE, EMAIL_UNLINKED_TTL
 
 logger = logging.getLogger(__name__)
 token_list = [
     # '',  # 添加github token
 ]
 
-def load_commit_objects(file_path):
+# git log 单次遍历：每个commit一个头部，随后是 --raw（状态和文件名）与 --numstat（增删行数）两组记录，
+# -z 时各字段以NUL分隔、文件名不转义，头部以 \x1e 开始、字段以 \x1f 分隔（%f为去掉特殊字符的标题）
+# 作者和提交者的邮箱只用于查找login，不写入数据集
+LOG_FORMAT = "%x1e%H%x1f%ad%x1f%an%x1f%ae%x1f%cn%x1f%ce%x1f%f"
+# 需要统计增删行数的commit超过该数量时，先一次下载镜像的全部文件内容，避免逐个commit按需下载
+BACKFILL_THRESHOLD = 1000
+# git的状态字母 -> 与github api一致的status
+FILE_STATUS = {
+    'A': 'added',
+    'M': 'modified',
+    'D': 'removed',
+    'R': 'renamed',
+    'C': 'copied',
+    'T': 'changed',
+}
+
+def _tokens(stream, chunk_size=1 << 20):
     """
-    将git log获取的commit基本信息转换为json
+    按NUL切分git输出，逐块读取，内存占用与仓库大小无关
     """
-    commits = []
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            if line.strip():
-                # 将每一行的JSON对象加载为Python字典
-                line = line.strip().rstrip(',')
-                commit = json.loads(line)
-                commits.append(commit)
-    return commits
+    rest = b''
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        parts = (rest + chunk).split(b'\0')
+        rest = parts.pop()
+        for part in parts:
+            yield part.decode('utf-8', errors='replace')
+    if rest:
+        yield rest.decode('utf-8', errors='replace')
 
-def extract_modified_filename(change_str):
+def parse_git_log(stream, repo_full_name):
     """
-    修改文件名的文件保留新的文件名
-    如'demo/components/{pir_translate.py => pir_program_test.py}'
+    解析 git log -z --raw --numstat 的输出，逐个生成完整的commit记录（含文件的状态和增删行数）
+    author_email、committer_email 供 resolve_logins 查找login，由其删除
+    raw和numstat按文件名对应，重命名的文件取新文件名
     """
-    start = change_str.find('=>') + 3  # Skip '=> ' to get to the new filename
-    end = change_str.find('}', start)
+    commit = None
+    files = {}
+    tokens = _tokens(stream)
+    for token in tokens:
+        token = token.lstrip('\n')
+        if token.startswith('\x1e'):  # 新commit的头部
+            if commit is not None:
+                commit['files'] = list(files.values())
+                yield commit
+            sha, created_at, author, author_email, committer, committer_email, message = token[1:].split('\x1f', 6)
+            commit = {
+                'repo': repo_full_name,
+                'sha': sha,
+                'created_at': created_at,
+                'author': author,
+                'committer': committer,
+                'message': message,
+                'author_email': author_email,
+                'committer_email': committer_email,
+            }
+            files = {}
+        elif token.startswith(':'):  # raw：:旧mode 新mode 旧sha 新sha 状态，随后是文件名（重命名、复制时为旧、新两个）
+            status = token.split()[-1]
+            filename = next(tokens)
+            if status[0] in 'RC':
+                filename = next(tokens)
+            files[filename] = {
+                'filename': filename,
+                'status': FILE_STATUS.get(status[0], 'modified'),
+                'additions': 0,
+                'deletions': 0,
+                'changes': 0,
+            }
+        elif token:  # numstat：增加\t删除\t文件名，重命名时文件名为空，随后是旧、新两个文件名；二进制文件为 -
+            additions, deletions, filename = token.split('\t', 2)
+            if not filename:
+                next(tokens)
+                filename = next(tokens)
+            additions = int(additions) if additions.isdigit() else 0
+            deletions = int(deletions) if deletions.isdigit() else 0
+            file = files.setdefault(filename, {'filename': filename, 'status': 'modified'})
+            file.update({'additions': additions, 'deletions': deletions, 'changes': additions + deletions})
+    if commit is not None:
+        commit['files'] = list(files.values())
+        yield commit
 
-    new_filename = change_str[start:end].strip()
+def iter_commits(repo_dir, repo_full_name, revisions=(), shas=None):
+    """
+    在本地仓库中运行一次git log，逐个生成commit记录
+    revisions 为git log的版本范围（如 ['<sha>..HEAD']），默认为全部历史；给出 shas 时只解析这些commit（按给出的顺序）
+    """
+    cmd = ['git', '-C', str(repo_dir), 'log', '-z', '--raw', '--numstat', '-M',
+           f'--format={LOG_FORMAT}', '--date=iso', *revisions]
+    with tempfile.TemporaryFile() as stdin:
+        if shas is not None:
+            cmd += ['--no-walk=unsorted', '--stdin']
+            stdin.write('\n'.join(shas).encode())
+            stdin.seek(0)
+        with subprocess.Popen(cmd, stdin=stdin, stdout=subprocess.PIPE) as proc:
+            yield from parse_git_log(proc.stdout, repo_full_name)
+    if proc.returncode != 0:
+        raise subprocess.CalledProcessError(proc.returncode, cmd)
 
-    base_path = change_str[:change_str.find('{')].strip()
-    return f"{base_path}{new_filename}"
+# 按commit查询作者和提交者对应的github用户，每个commit为一个别名
+LOGIN_FIELDS = "... on Commit { author { email user { login } } committer { email user { login } } }"
 
-def parse_commit_logs1(file_path):
+def _load_email_logins() -> dict:
     """
-    解析git log --name-status获取的commit信息
+    {"logins": {邮箱: login}, "unlinked": {邮箱: 查询时间}}
+    没有关联用户的邮箱只在 EMAIL_UNLINKED_TTL 秒内有效，之后重新查询（用户可能后来在github上添加了该邮箱）
     """
-    commit_data = {}
-    current_sha = None
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if line.startswith("STARTOFTHECOMMIT"):
-                current_sha = line.split(": ")[1]
-                commit_data[current_sha] = {'files': []}
-            else:
-                if line:
-                    parts = line.split()
-                    if len(parts) == 2:
-                        status, filename = parts[0], parts[1]
-                        if status == 'A':
-                            status = 'added'
-                        elif status == 'M':
-                            status = 'modified'
-                        else:
-                            status = 'removed'
-                        commit_data[current_sha]['files'].append({
-                            'filename': filename,
-                            'status': status,
-                        })
-                    elif len(parts) == 3:
-                        status, filename = parts[0], parts[2]
-                        commit_data[current_sha]['files'].append({
-                            'filename': filename,
-                            'status': 'modified',
-                        })
-    return commit_data
+    cache = {"logins": {}, "unlinked": {}}
+    if os.path.exists(EMAIL_LOGIN_CACHE):
+        with open(EMAIL_LOGIN_CACHE, 'r', encoding='utf-8') as f:
+            cache.update(json.load(f))
+    expire = time.time() - EMAIL_UNLINKED_TTL
+    cache["unlinked"] = {email: checked for email, checked in cache["unlinked"].items() if checked >= expire}
+    return cache
 
-def parse_commit_logs2(file_path):
+def _save_email_logins(cache: dict):
+    os.makedirs(os.path.dirname(EMAIL_LOGIN_CACHE) or '.', exist_ok=True)
+    tmp_file = f"{EMAIL_LOGIN_CACHE}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=4, sort_keys=True)
+    os.replace(tmp_file, EMAIL_LOGIN_CACHE)
+
+def _cached_login(cache: dict, email: str):
     """
-    解析git log --numstat获取的commit信息
+    返回 (是否已知, login)；空邮箱不能确定用户，总是未知
     """
-    commit_data = {}
-    current_sha = None
-    with open(file_path, 'r', encoding='utf-8') as f:
-        for line in f:
-            line = line.strip()
-            if line.startswith("STARTOFTHECOMMIT"):
-                current_sha = line.split(": ")[1]
-                commit_data[current_sha] = {'files': []}
-            else:
-                if line:
-                    parts = line.split()
-                    # print(line)
-                    additions = int(parts[0]) if parts[0].isdigit() else 0
-                    deletions = int(parts[1]) if parts[1].isdigit() else 0
-                    # filename = extract_modified_filename(parts[2]) if "=>" in parts[2] else parts[2]
-                    commit_data[current_sha]['files'].append({
-                        # 'filename': filename,
-                        'additions': additions,
-                        'deletions': deletions,
-                        'changes': additions + deletions
-                        })
-    return commit_data
+    if email in cache["logins"]:
+        return True, cache["logins"][email]
+    return bool(email) and email in cache["unlinked"], None
 
-def get_login_for_commit(gh, repo_full_name, sha):
+def _cache_login(cache: dict, email: str, login, checked: float):
+    if not email:
+        return
+    if login:
+        cache["logins"][email] = login
+        cache["unlinked"].pop(email, None)
+    else:
+        cache["unlinked"][email] = checked
+        cache["logins"].pop(email, None)
+
+def _query_logins(token, repo_full_name, shas):
     """
-    获取指定commit的作者和提交者的login
+    一次GraphQL请求查询最多100个commit的作者和提交者，返回 {sha: commit}（github上不存在的commit为None）
     """
-    try:
-        repo = gh.get_repo(repo_full_name)
-        commit = repo.get_commit(sha)
-        return {
-            "sha": sha,
-            "author": commit.author.login if commit.author else None,
-            "committer": commit.committer.login if commit.committer else None
-        }
-    except Exception as e:
-        return {"sha": sha, "error": str(e)}
+    repo_owner, repo_name = repo_full_name.split('/')
+    aliases = "\n".join(f'c{i}: object(oid: "{sha}") {{ {LOGIN_FIELDS} }}' for i, sha in enumerate(shas))
+    query = f"""
+    query ($owner: String!, $name: String!) {{
+        repository(owner: $owner, name: $name) {{
+            {aliases}
+        }}
+    }}
+    """
+    repository = request_graphql(token, query, {"owner": repo_owner, "name": repo_name})['repository']
+    return {sha: repository[f"c{i}"] for i, sha in enumerate(shas)}
 
-def update_logins(repo_full_name, commit_list):
+def resolve_logins(token, repo_full_name, commit_list, batch_size=100):
     """
-    用pygithub获取commit的author和committer的login，替换当前可能不准确的author和committer
+    将commit的author和committer由git中的名字替换为github的login（与github api中commit的author、committer一致）
+    github按邮箱关联用户，邮箱->login保存在 EMAIL_LOGIN_CACHE 中，作者和提交者的邮箱都已知的commit不需要请求；
+    其余commit每batch_size个一次GraphQL请求，结果加入缓存。没有关联用户时为None，该结果在 EMAIL_UNLINKED_TTL 内有效
+    查询失败或github上不存在的commit保留git中的名字
     """
-    gh_list = [Github(token) for token in token_list]
-    updated_list = []
-    sha_to_commit = {commit["sha"]: commit for commit in commit_list}
-
-    tasks = []
-    with ThreadPoolExecutor(max_workers=3 * len(gh_list)) as executor:
-        for i, sha in enumerate(sha_to_commit):
-            tasks.append(executor.submit(get_login_for_commit, gh_list[i % len(gh_list)], repo_full_name, sha))
+    cache = _load_email_logins()
+    unresolved = []
+    for commit in commit_list:
+        resolved = [_cached_login(cache, commit[f'{role}_email'].lower()) for role in ('author', 'committer')]
+        if all(known for known, _ in resolved):
+            commit['author'], commit['committer'] = (login for _, login in resolved)
+        else:
+            unresolved.append(commit)
+    logger.info(f"Resolved {len(commit_list) - len(unresolved)} commits of {repo_full_name} from the email cache, "
+                f"querying {len(unresolved)}")
 
-        for future in tqdm(as_completed(tasks), total=len(tasks), desc=f"Fetching logins for {repo_full_name}"):
-            result = future.result()
-            sha = result["sha"]
-            commit = sha_to_commit[sha]
-            if "error" in result:
-                logger.warning(f"Login fetch failed for {sha}: {result['error']}")
-            else:
-                commit["author"] = result["author"]
-                commit["committer"] = result["committer"]
-            updated_list.append(commit)
+    try:
+        for i in tqdm(range(0, len(unresolved), batch_size), desc=f"Fetching logins for {repo_full_name}"):
+            batch = unresolved[i:i + batch_size]
+            try:
+                results = _query_logins(token, repo_full_name, [commit['sha'] for commit in batch])
+            except GraphQLError as e:
+                logger.warning(f"Login fetch failed for {len(batch)} commits of {repo_full_name}: {e}")
+                continue
+            checked = time.time()
+            for commit in batch:
+                result = results[commit['sha']]
+                if not result:
+                    logger.warning(f"Commit {commit['sha']} not found in {repo_full_name}")
+                    continue
+                for role in ('author', 'committer'):
+                    actor = result[role] or {}
+                    commit[role] = actor['user']['login'] if actor.get('user') else None
+                    _cache_login(cache, commit[f'{role}_email'].lower(), commit[role], checked)
+    finally:
+        _save_email_logins(cache)
 
-    return updated_list
+    for commit in commit_list:
+        del commit['author_email'], commit['committer_email']
+    return commit_list
 
 def get_repo_commits(repo_full_name):
     """ 
-    使用Shell脚本获取指定仓库的所有commit
-    该方法使用git log命令获取commit信息，并将其转换为JSON格式。
-    适用于需要处理大量仓库的情况，速度较快。
+    使用git log获取指定仓库的所有commit
+    在本地镜像中只运行一次git log，边读取边解析，适用于需要处理大量仓库的情况，速度较快。
     """
     logger.info(f"Processing repository: {repo_full_name}")
-
-    # 定义Shell脚本的内容，使用传入的仓库名称
-    shell_script = f"""
-    FULL_NAME="{repo_full_name}"
-    REPO_URL="https://github.com/$FULL_NAME.git"
-    FILE_NAME=$(echo $FULL_NAME | tr '/' '_')
-    
-    # 指定目录，clone repo
-    DEST_DIR="./tmp_repo"
-    mkdir -p $DEST_DIR
-    CLONE_PATH="$DEST_DIR/$FILE_NAME"
-    git clone $REPO_URL $CLONE_PATH
-
-    # 获取commit日志
-    cd $CLONE_PATH
-    git log --pretty=format:'{{"repo": "{repo_full_name}", "sha": "%H", "created_at": "%ad", "author": "%an", "committer": "%cn", "message": "%f"}},' --date=iso | sed "$ s/,$//" > ../${{FILE_NAME}}_commits.json
-    git log --name-status --pretty=format:'STARTOFTHECOMMIT: %H'> ../${{FILE_NAME}}_commits1.log
-    git log --numstat --pretty=format:'STARTOFTHECOMMIT: %H'> ../${{FILE_NAME}}_commits2.log
-
-    # 返回当前目录
-    cd ../.. 
-    """
-
-    # 执行Shell命令
     try:
-        subprocess.run(shell_script, shell=True, check=True, capture_output=True, text=True)
-        # print("Execution completed.")
+        mirror = git_mirror.sync(repo_full_name)
     except subprocess.CalledProcessError as e:
-        print(f"An error occurred: {e.stderr}")
+        logger.error(f"Error syncing {repo_full_name}: {e.stderr}")
+        return []
+    git_mirror.backfill(mirror)
+    commit_list = list(iter_commits(mirror, repo_full_name))
 
-    commits_file = f"tmp_repo/{repo_full_name.replace('/', '_')}_commits.json"
-    commits1_file = f"tmp_repo/{repo_full_name.replace('/', '_')}_commits1.log"
-    commits2_file = f"tmp_repo/{repo_full_name.replace('/', '_')}_commits2.log"
-    commits = load_commit_objects(commits_file)
-    commit_details_1 = parse_commit_logs1(commits1_file)
-    commit_details_2 = parse_commit_logs2(commits2_file)
+    # 获取commit的author和committer的login，替换当前可能不准确的author和committer
+    commit_list = resolve_logins(token_list[0], repo_full_name, commit_list)
+    return commit_list
 
-    # 合并信息
-    commit_list = []
-    for commit in commits:
-        sha = commit['sha']
-        files_1 = commit_details_1.get(sha, {}).get('files', [])
-        files_2 = commit_details_2.get(sha, {}).get('files', [])
+def refresh_repo_commits(repo_full_name):
+    """
+    增量更新数据集中指定仓库的commit：fetch本地镜像后只解析数据集中还没有的commit，加在已有数据之前
+    通常为上次记录的commit之后的新commit；没有记录或记录的commit已不在历史中（如force push）时与全部历史比较，
+    已有commit的数据保留不变，不再重新解析
+    镜像不含文件内容，--numstat 统计增删行数时git按需下载，每个commit一次请求：新commit不多时只下载其涉及的文件，
+    超过 BACKFILL_THRESHOLD 个（如首次运行）时先一次下载全部文件内容（与完整clone相当，只需一次）
+    返回新增的commit数
+    """
+    output = dataset.json_path(repo_full_name, 'commits')
+    mirror = git_mirror.sync(repo_full_name)
+    head = git_mirror.head(mirror)
 
-        for i in range(len(files_1)):
-            file_1 = files_1[i]
-            file_2 = files_2[i] if i < len(files_2) else {}
-            file_1.update(file_2)
+    existing = []
+    if output.exists():
+        with open(output, 'r', encoding='utf-8') as f:
+            existing = json.load(f)
+    known = {commit['sha'] for commit in existing}
+    last = git_mirror.recorded(repo_full_name)
+    if last == head and last in known:
+        logger.info(f"{repo_full_name} is up to date at {head}")
+        return 0
 
-        commit['files'] = files_1
-        commit_list.append(commit)
-    
-    # 用pygithub获取commit的author和committer的login，替换当前可能不准确的author和committer
-    commit_list = update_logins(repo_full_name, commit_list)
+    if last in known and git_mirror.is_ancestor(mirror, last, head):
+        shas = git_mirror.rev_list(mirror, f"{last}..{head}")
+    else:
+        if last in known:
+            logger.warning(f"Recorded commit {last} of {repo_full_name} is no longer in history, comparing full history")
+        history = git_mirror.rev_list(mirror, head)
+        shas = [sha for sha in history if sha not in known]
+        history = set(history)
+        existing = [commit for commit in existing if commit['sha'] in history]
 
-    # 删除tmp_repo目录
-    subprocess.run(f"rm -rf tmp_repo", shell=True, check=True)
-    # print(f"Merged data for {repo_owner_repo} into {output_filename}")
-    return commit_list
+    if len(shas) > BACKFILL_THRESHOLD:
+        git_mirror.backfill(mirror)
+    commits = list(iter_commits(mirror, repo_full_name, shas=shas)) if shas else []
+    new_commits = resolve_logins(token_list[0], repo_full_name, commits)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    write_json_list(new_commits + existing, output, ensure_ascii=True)
+    git_mirror.record(repo_full_name, head)
+    logger.info(f"Added {len(new_commits)} commits to {output}")
+    return len(new_commits)
 
 def get_repo_commits_gh(gh, repo_full_name):
     """
@@ -260,17 +328,21 @@ def get_repo_commits_gh(gh, repo_full_name):
     return commit_list
 
 if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s (PID %(process)d) [%(levelname)s] %(filename)s:%(lineno)d %(message)s",
+        level=logging.INFO,
+    )
 
     repos = None
-    with open("data/paddle_repo.json", "r", encoding="utf-8") as f:
+    with open(dataset.DATA_DIR / "paddle_repos.json", "r", encoding="utf-8") as f:
         repos = json.load(f)
 
+    # 增量更新：首次运行时clone镜像并解析全部历史，之后只fetch和解析新commit
     for repo in repos:
-        commits = get_repo_commits(repo['full_name'])
-        repo_owner, repo_name = repo['full_name'].split('/')
-        output_filename = f"data/paddle_commits/{repo_owner}_{repo_name}_commits.json"
-        with open(output_filename, 'w', encoding='utf-8') as f:
-            json.dump(commits, f, indent=4)
+        try:
+            refresh_repo_commits(repo['full_name'])
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Error refreshing commits of {repo['full_name']}: {e.stderr or e}")
 
     # 方法2：用github api获取
     # token = '' # 添加你的GitHub token
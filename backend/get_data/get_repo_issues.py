@@ -1,15 +1,14 @@
+import os
 import time
 import json
+from pathlib import Path
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
-import requests
-from github import Github
 
-from utils.request_github import request_github
+from utils.request_github import request_github, request_graphql, GraphQLError
+from utils.request_github import PAGE_INFO, ACTOR_FIELDS, graphql_connection, graphql_nodes, graphql_login, graphql_time
 
 logger = logging.getLogger(__name__)
-GITHUB_GRAPHQL_ENDPOINT = "https://api.github.com/graphql"
 token_list = [
     '',  # 添加github token
 ]
@@ -59,159 +58,149 @@ def fetch_issue_info(gh, repo_full_name, issue_num):
             'error': str(e)
             }
 
-def fetch_issue_info_graphql(token, repo_full_name, issue_num):
-    """
-    使用GitHub GraphQL获取指定issue的信息（替代 REST API）
+# GraphQL分页列出issue（不含PR），评论和标签随issue一起获取，超出首页时才单独继续获取
+COMMENT_FIELDS = f"{ACTOR_FIELDS} createdAt"
+ISSUE_FIELDS = f"""
+    id number title body state createdAt updatedAt closedAt
+    {ACTOR_FIELDS}
+    timelineItems(itemTypes: [CLOSED_EVENT], last: 1) {{ nodes {{ ... on ClosedEvent {{ actor {{ login __typename }} }} }} }}
+    {graphql_connection('comments', 100, COMMENT_FIELDS)}
+    {graphql_connection('labels', 20, 'name')}
+"""
+ISSUES_QUERY = f"""
+query ($owner: String!, $name: String!, $first: Int!, $cursor: String) {{
+    repository(owner: $owner, name: $name) {{
+        issues(first: $first, after: $cursor, orderBy: {{field: CREATED_AT, direction: DESC}}) {{
+            totalCount
+            {PAGE_INFO}
+            nodes {{ {ISSUE_FIELDS} }}
+        }}
+    }}
+}}
+"""
+ISSUE_QUERY = f"""
+query ($owner: String!, $name: String!, $issueNumber: Int!) {{
+    repository(owner: $owner, name: $name) {{
+        issue(number: $issueNumber) {{ {ISSUE_FIELDS} }}
+    }}
+}}
+"""
+
+def issue_record(token, repo_full_name, issue):
     """
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.github+json",
-    }
-
-    repo_owner, repo_name = repo_full_name.split('/')
-    query = """
-    query ($owner: String!, $name: String!, $issueNumber: Int!, $cursor: String) {
-        repository(owner: $owner, name: $name) {
-            issue(number: $issueNumber) {
-                number
-                title
-                body
-                state
-                createdAt
-                updatedAt
-                closedAt
-                author {
-                    login
-                }
-                labels(first: 10) {
-                    nodes {
-                        name
-                    }
-                }
-                comments(first: 100, after: $cursor) {
-                    pageInfo {
-                        hasNextPage
-                        endCursor
-                    }
-                    nodes {
-                        author {
-                            login
-                        }
-                    }
-                }
-            }
-        }
-    }
+    将GraphQL返回的issue转为 paddle_issues 的记录格式（comment_by 为 [(login, 评论时间), ...]）
     """
-
-    variables = {
-        "owner": repo_owner,
-        "name": repo_name,
-        "issueNumber": issue_num,
-        "cursor": None  # 用于分页
-    }
-
-    response = requests.post(GITHUB_GRAPHQL_ENDPOINT, headers=headers, json={'query': query, 'variables': variables})
-    if response.status_code != 200:
-        return {"error": f"GraphQL query failed: {response.text}", "issue_number": issue_num}
-
-    data = response.json()
     try:
-        issue = data['data']['repository']['issue']
-        if issue is None:
-            return {"error": "Issue not found", "issue_number": issue_num}
-
-        issue_info = {
-            "repo": repo_full_name,
-            "number": issue["number"],
-            "title": issue["title"],
-            "body": issue["body"],
-            "state": issue["state"],
-            "user": issue["author"]["login"] if issue["author"] else None,
-            "closed_by": None,  # GraphQL 暂无
-            "created_at": issue["createdAt"],
-            "updated_at": issue["updatedAt"],
-            "closed_at": issue["closedAt"],
-            "comments_count": [
-                c["author"]["login"] if c["author"] else None for c in issue["comments"]["nodes"]
-            ],
-            "labels": [label["name"] for label in issue["labels"]["nodes"]]
+        closed = issue['timelineItems']['nodes']
+        comments = graphql_nodes(token, issue['id'], 'Issue', 'comments', issue['comments'], COMMENT_FIELDS)
+        labels = graphql_nodes(token, issue['id'], 'Issue', 'labels', issue['labels'], 'name')
+        return {
+            'repo': repo_full_name,
+            'number': issue['number'],
+            'title': issue['title'],
+            'body': issue['body'] or None,
+            'state': issue['state'].lower(),
+            'user': graphql_login(issue['author']),
+            'closed_by': graphql_login(closed[0]['actor']) if closed and issue['state'] == 'CLOSED' else None,
+            'created_at': graphql_time(issue['createdAt']),
+            'updated_at': graphql_time(issue['updatedAt']),
+            'closed_at': graphql_time(issue['closedAt']),
+            'comment_by': [(graphql_login(c['author']), graphql_time(c['createdAt'])) for c in comments],
+            'labels': [label['name'] for label in labels],
         }
-
-        return issue_info
     except Exception as e:
-        logger.error(f"Error fetching issue {issue_num}: {e}")
+        logger.error(f"Error fetching issue {issue['number']}: {e}")
         return {
             'repo': repo_full_name,
-            'issue_number': issue_num,
+            'issue_number': issue['number'],
             'error': str(e)
             }
-    
-def get_repo_prs_n(repo_full_name):
+
+def fetch_issue_info_graphql(token, repo_full_name, issue_num):
     """
-    获取指定仓库的所有PR的number, 用于识别issue编号
+    使用GitHub GraphQL获取指定issue的信息（替代 REST API），记录格式与 iter_repo_issues 一致
     """
-    gh = Github(token_list[0])
-
-    prs = request_github(
-        gh, lambda r: gh.get_repo(r).get_pulls(state='all', sort='created', direction='desc'),
-        (repo_full_name, )
-    )
-    if prs == None:
-        logger.warning(f"No PRs found for repository: {repo_full_name}")
-        return []
-
-    pr_num_list = []
-    for pr in tqdm(prs):
-        pr_num_list.append(pr.number)
+    repo_owner, repo_name = repo_full_name.split('/')
+    try:
+        data = request_graphql(token, ISSUE_QUERY, {"owner": repo_owner, "name": repo_name, "issueNumber": issue_num})
+    except GraphQLError as e:
+        return {'repo': repo_full_name, 'issue_number': issue_num, 'error': str(e)}
+    issue = data['repository']['issue']
+    if issue is None:  # 编号是PR，或issue已删除/转移
+        return {'repo': repo_full_name, 'issue_number': issue_num, 'error': "Issue not found"}
+    return issue_record(token, repo_full_name, issue)
+
+def iter_repo_issues(token, repo_full_name, page_size=100):
+    """
+    按创建时间从新到旧分页列出仓库的所有issue（GraphQL的issues不含PR），逐个生成记录
+    查询过重（超时）时减小每页的issue数
+    """
+    repo_owner, repo_name = repo_full_name.split('/')
+    cursor = None
+    progress = None
+    while True:
+        variables = {"owner": repo_owner, "name": repo_name, "first": page_size, "cursor": cursor}
+        try:
+            repository = request_graphql(token, ISSUES_QUERY, variables)['repository']
+        except GraphQLError:
+            if page_size <= 10:
+                raise
+            page_size //= 2
+            logger.warning(f"Reducing page size to {page_size} for {repo_full_name}")
+            continue
+        if repository is None:
+            logger.warning(f"Repository not found: {repo_full_name}")
+            return
+        issues = repository['issues']
+        if progress is None:
+            progress = tqdm(total=issues['totalCount'], desc=f"Processing {repo_full_name}")
+        for issue in issues['nodes']:
+            yield issue_record(token, repo_full_name, issue)
+        progress.update(len(issues['nodes']))
+        if not issues['pageInfo']['hasNextPage']:
+            break
+        cursor = issues['pageInfo']['endCursor']
+    progress.close()
+
+def _dump_item(record, ensure_ascii=False):
+    r"""
+    json数组中的一项，每行缩进4格；只按 \n 分行：json字符串中可能有U+2028、U+2029、\x85等字符，
+    textwrap.indent（str.splitlines）会把它们当作换行，在其后插入空格，改变字符串内容
+
+    >>> record = {"body": "a\u2028b\u2029c\x85d\ne"}
+    >>> text = "[\n" + _dump_item(record) + "\n]"
+    >>> text == json.dumps([record], indent=4, ensure_ascii=False) and json.loads(text) == [record]
+    True
+    """
+    return "\n".join("    " + line for line in json.dumps(record, indent=4, ensure_ascii=ensure_ascii).split("\n"))
 
-    return pr_num_list
+def write_json_list(records, path, ensure_ascii=False):
+    """
+    逐条写入json数组（格式与 json.dump(list, indent=4, ensure_ascii=...) 相同），不需要在内存中保存全部记录
+    先写临时文件，完成后替换，中断时不会留下不完整的文件；返回写入的条数
+    """
+    path = Path(path)
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    count = 0
+    with open(tmp, "w", newline="", encoding="utf-8") as f:
+        for record in records:
+            f.write(",\n" if count else "[\n")
+            f.write(_dump_item(record, ensure_ascii))
+            count += 1
+        f.write("\n]" if count else "[]")
+    os.replace(tmp, path)
+    return count
 
 def get_repo_issues(repo_full_name):
     """
     获取指定仓库的所有issue
     """
-    gh_list = [Github(token) for token in token_list]
-    gh = gh_list[0]  # 使用第一个令牌的GitHub实例
-
-    issues = request_github(
-        gh, lambda r: gh.get_repo(r).get_issues(state='all', sort='created', direction='desc'),
-        (repo_full_name, )
-    ) 
-    
-    if issues == None:
-        logger.warning(f"No issues found for repository: {repo_full_name}")
-        return []
-    
-    issue_num_now = 0
-    for issue in issues:
-        issue_num_now = issue.number
-        break
-
-    issue_num_list = [i + 1 for i in range(issue_num_now)]
-    # 去除其中的pr
-    pr_num_list = get_repo_prs_n(repo_full_name)
-    # owner, name = repo_full_name.split('/')
-    # try:
-    #     with open(f"data/paddle_prs_n/{owner}_{name}_prs_n.json", "r", encoding="utf-8") as f:
-    #         pr_num_list = json.load(f)
-    # except FileNotFoundError:
-    #     logging.error(f"PR numbers file not found for {owner}_{name}. Using empty list.")
-    #     return []
-    issue_num_list = [num for num in issue_num_list if num not in pr_num_list]
-    
-    logger.info(f"Fetching issues for repository: {repo_full_name}, total: {len(issue_num_list)}")
     issue_list = []
-    with ThreadPoolExecutor(max_workers=3 * len(gh_list)) as executor:
-        # 分配任务到令牌 gh
-        future_to_issue = {executor.submit(fetch_issue_info, gh_list[i % len(gh_list)], repo_full_name, issue_num): issue_num for i, issue_num in enumerate(issue_num_list)}
-        # future_to_issue = {executor.submit(fetch_issue_info_graphql, token_list[i % len(token_list)], repo_full_name, issue_num): issue_num for i, issue_num in enumerate(issue_num_list)}
-
-        for future in tqdm(as_completed(future_to_issue), total=len(future_to_issue), desc=f"Processing {repo_full_name}"):
-            issue_info = future.result()
-            if 'error' in issue_info:
-                logging.error(f"Error fetching issue {issue_info['issue_number']} for repository {repo_full_name}: {issue_info['error']}")
-            issue_list.append(issue_info)
+    for issue_info in iter_repo_issues(token_list[0], repo_full_name):
+        if 'error' in issue_info:
+            logging.error(f"Error fetching issue {issue_info['issue_number']} for repository {repo_full_name}: {issue_info['error']}")
+        issue_list.append(issue_info)
+    logger.info(f"Fetched issues for repository: {repo_full_name}, total: {len(issue_list)}")
     return issue_list
 
 if __name__ == "__main__":
@@ -225,12 +214,10 @@ if __name__ == "__main__":
         repos = json.load(f)
     # issue_list = []
     for repo in repos:
-        # 获取每个仓库的issue信息
-        issues = get_repo_issues(repo['full_name'])
-        # if issues:
-        #     issue_list.extend(issues)
+        # 获取每个仓库的issue信息，边获取边写入
         repo_owner, repo_name = repo['full_name'].split('/')
-        with open(f"data/paddle_issues/{repo_owner}_{repo_name}_issues.json", "w", newline="", encoding="utf-8") as f:
-            json.dump(issues, f, indent=4, ensure_ascii=False)
+        count = write_json_list(iter_repo_issues(token_list[0], repo['full_name']),
+                                f"data/paddle_issues/{repo_owner}_{repo_name}_issues.json")
+        logger.info(f"Fetched issues for repository: {repo['full_name']}, total: {count}")
     # with open("data/paddle_issues.json", "w", newline="", encoding="utf-8") as f:
     #     json.dump(issue_list, f, indent=4, ensure_ascii=False)
\ No newline at end of file
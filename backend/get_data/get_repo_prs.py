@@ -1,16 +1,13 @@
 import time
 import json
 from tqdm import tqdm
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
-import requests
-from github import Github
 
-from utils.request_github import request_github
+from utils.request_github import request_github, request_graphql, GraphQLError
+from utils.request_github import PAGE_INFO, ACTOR_FIELDS, graphql_connection, graphql_nodes, graphql_login, graphql_time
 from utils.content_processor import get_pr_type
 
 logger = logging.getLogger(__name__)
-GITHUB_GRAPHQL_ENDPOINT = "https://api.github.com/graphql"
 token_list = [
     '',  # 添加github token
 ]
@@ -88,171 +85,157 @@ def fetch_pr_info(gh, repo_full_name, pr_num):
             'error': str(e)
         }
 
-def fetch_pr_info_graphql(token, repo_full_name, pr_num):
-    """
-    使用GitHub GraphQL获取指定pr的信息（替代 REST API）
-    """
-    headers = {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.github+json",
-    }
-
-    repo_owner, repo_name = repo_full_name.split('/')
-    query = """
-    query ($owner: String!, $name: String!, $prNumber: Int!, $cursor: String) {
-        repository(owner: $owner, name: $name) {
-            pullRequest(number: $prNumber) {
-                number
-                title
-                body
-                state
-                merged
-                createdAt
-                closedAt
-                additions
-                deletions
-                changedFiles
-                author {
-                    login
-                }
-                mergedBy {
-                    login
-                }
-                commits(first: 100, after: $commitsCursor) {
-                    pageInfo {
-                        hasNextPage
-                        endCursor
-                    }
-                    nodes {
-                        commit {
-                            oid
-                        }
-                    }
-                }
-                comments(first: 100, after: $commentsCursor) {
-                    pageInfo {
-                        hasNextPage
-                        endCursor
-                    }
-                    nodes {
-                        author {
-                            login
-                        }
-                    }
-                }
-                reviewThreads(first: 100, after: $reviewsCursor) {
-                    pageInfo {
-                        hasNextPage
-                        endCursor
-                    }
-                    nodes {
-                        comments(first: 100) {
-                            nodes {
-                                author {
-                                    login
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    }
-    """
+# GraphQL批量获取：每次请求获取page_size个PR及其commits、评论、review评论和文件，
+# 嵌套的连接超出首页时才单独继续获取
+COMMIT_FIELDS = "commit { oid }"
+COMMENT_FIELDS = f"{ACTOR_FIELDS} createdAt"
+FILE_FIELDS = "path additions deletions changeType"
 
-    variables = {
-        "owner": repo_owner,
-        "name": repo_name,
-        "prNumber": pr_num,
-        "cursor": None  # 用于分页
-    }
+THREAD_FIELDS = f"id {graphql_connection('comments', 20, COMMENT_FIELDS)}"
+PR_FIELDS = f"""
+    id number title body state merged createdAt closedAt additions deletions changedFiles
+    {ACTOR_FIELDS}
+    mergedBy {{ login __typename }}
+    {graphql_connection('commits', 100, COMMIT_FIELDS)}
+    {graphql_connection('comments', 100, COMMENT_FIELDS)}
+    {graphql_connection('reviewThreads', 50, THREAD_FIELDS)}
+    {graphql_connection('files', 100, FILE_FIELDS)}
+"""
+PRS_QUERY = f"""
+query ($owner: String!, $name: String!, $first: Int!, $cursor: String) {{
+    repository(owner: $owner, name: $name) {{
+        pullRequests(first: $first, after: $cursor, orderBy: {{field: CREATED_AT, direction: DESC}}) {{
+            totalCount
+            {PAGE_INFO}
+            nodes {{ {PR_FIELDS} }}
+        }}
+    }}
+}}
+"""
+PR_QUERY = f"""
+query ($owner: String!, $name: String!, $prNumber: Int!) {{
+    repository(owner: $owner, name: $name) {{
+        pullRequest(number: $prNumber) {{ {PR_FIELDS} }}
+    }}
+}}
+"""
+# REST中文件的status
+FILE_STATUS = {
+    "ADDED": "added",
+    "DELETED": "removed",
+    "MODIFIED": "modified",
+    "RENAMED": "renamed",
+    "COPIED": "copied",
+    "CHANGED": "changed",
+}
 
-    response = requests.post(GITHUB_GRAPHQL_ENDPOINT, headers=headers, json={'query': query, 'variables': variables})
-    if response.status_code != 200:
-        return {"error": f"GraphQL query failed: {response.text}", "pr_number": pr_num}
-
-    data = response.json()
+def pr_record(token, repo_full_name, pr):
+    """
+    将GraphQL返回的PR转为 paddle_prs 的记录格式（与 fetch_pr_info 一致）
+    """
     try:
-        pr = data['data']['repository']['pullRequest']
-        if pr is None:
-            return {"error": "Pr not found", "pr_number": pr_num}
-
         pr_info = {
-            "repo": repo_full_name,
-            "number": pr['number'],
-            "title": pr['title'],
-            "body": pr['body'],
-            "state": pr['state'],
-            "merged": pr['merged'],
-            "user": pr['author']['login'] if pr['author'] else None,
-            "merged_by": pr['mergedBy']['login'] if pr['mergedBy'] else None,
-            "created_at": pr['createdAt'],
-            "closed_at": pr['closedAt'],
-            "additions": pr['additions'],
-            "deletions": pr['deletions'],
-            "changed_files": pr['changedFiles'],
-            "commits": [c['commit']['oid'] for c in pr['commits']['nodes']],
-            "comment_by": [c['author']['login'] for c in pr['comments']['nodes'] if c['author']],
-            "review_by": list({rc['author']['login']
-                               for rt in pr['reviewThreads']['nodes']
-                               for rc in rt['comments']['nodes']
-                               if rc['author']}),
+            'repo': repo_full_name,
+            'number': pr['number'],
+            'title': pr['title'],
+            'body': pr['body'] or None,
+            'issue_number': str(pr['number']),
+            'state': 'open' if pr['state'] == 'OPEN' else 'closed',
+            'merged': pr['merged'],
+            'user': graphql_login(pr['author']),
+            'merged_by': graphql_login(pr['mergedBy']),
+            'created_at': graphql_time(pr['createdAt']),
+            'closed_at': graphql_time(pr['closedAt']),
+            'additions': pr['additions'],
+            'deletions': pr['deletions'],
+            'changed_files': pr['changedFiles'],
         }
-
+        commits = graphql_nodes(token, pr['id'], 'PullRequest', 'commits', pr['commits'], COMMIT_FIELDS)
+        pr_info['commits'] = [c['commit']['oid'] for c in commits]
+        comments = graphql_nodes(token, pr['id'], 'PullRequest', 'comments', pr['comments'], COMMENT_FIELDS)
+        pr_info['comment_by'] = [(graphql_login(c['author']), graphql_time(c['createdAt'])) for c in comments]
+        # review评论分属各个review thread，按时间排序，与REST的顺序一致
+        review_comments = []
+        for thread in graphql_nodes(token, pr['id'], 'PullRequest', 'reviewThreads', pr['reviewThreads'], THREAD_FIELDS):
+            review_comments.extend(graphql_nodes(token, thread['id'], 'PullRequestReviewThread', 'comments',
+                                              thread['comments'], COMMENT_FIELDS))
+        review_comments.sort(key=lambda c: c['createdAt'])
+        pr_info['review_by'] = [(graphql_login(c['author']), graphql_time(c['createdAt'])) for c in review_comments]
+        files = graphql_nodes(token, pr['id'], 'PullRequest', 'files', pr['files'], FILE_FIELDS)
+        pr_info['files'] = [{
+            'filename': f['path'],
+            'status': FILE_STATUS.get(f['changeType'], f['changeType'].lower()),
+            'additions': f['additions'],
+            'deletions': f['deletions'],
+            'changes': f['additions'] + f['deletions'],
+        } for f in files]
+        # 获取类型
+        pr_info['type'] = get_pr_type(pr['title'], pr_info['body'])
         return pr_info
     except Exception as e:
-        logger.error(f"Error fetching PR {pr.number} for repository {pr.base.repo.full_name}: {e}")
+        logger.error(f"Error fetching PR {pr['number']} for repository {repo_full_name}: {e}")
         return {
             'repo': repo_full_name,
-            'number': pr.number,
+            'number': pr['number'],
             'error': str(e)
         }
 
-def get_repo_prs(repo_full_name):
+def fetch_pr_info_graphql(token, repo_full_name, pr_num):
     """
-    获取指定仓库的所有PR
+    使用GitHub GraphQL获取指定pr的信息（替代 REST API），记录格式与 fetch_pr_info 一致
     """
-    gh_list = [Github(token) for token in token_list]
-    gh = gh_list[0]  # 使用第一个令牌的GitHub实例
+    repo_owner, repo_name = repo_full_name.split('/')
+    try:
+        data = request_graphql(token, PR_QUERY, {"owner": repo_owner, "name": repo_name, "prNumber": pr_num})
+    except GraphQLError as e:
+        return {'repo': repo_full_name, 'number': pr_num, 'error': str(e)}
+    pr = data['repository']['pullRequest']
+    if pr is None:
+        return {'repo': repo_full_name, 'number': pr_num, 'error': "PR not found"}
+    return pr_record(token, repo_full_name, pr)
 
-    prs = request_github(
-        gh, lambda r: gh.get_repo(r).get_pulls(state='all', sort='created', direction='desc'),
-        (repo_full_name, )
-    )
-    if prs == None:
-        logger.warning(f"No PRs found for repository: {repo_full_name}")
-        return []
-    
-    pr_num_list = []
-    for pr in tqdm(prs):
-        pr_num_list.append(pr.number)
+def iter_repo_prs(token, repo_full_name, page_size=50):
+    """
+    按创建时间从新到旧分页获取仓库的所有PR，逐个生成 paddle_prs 格式的记录
+    查询过重（超时）时减小每页的PR数
+    """
+    repo_owner, repo_name = repo_full_name.split('/')
+    cursor = None
+    progress = None
+    while True:
+        variables = {"owner": repo_owner, "name": repo_name, "first": page_size, "cursor": cursor}
+        try:
+            repository = request_graphql(token, PRS_QUERY, variables)['repository']
+        except GraphQLError:
+            if page_size <= 5:
+                raise
+            page_size //= 2
+            logger.warning(f"Reducing page size to {page_size} for {repo_full_name}")
+            continue
+        if repository is None:
+            logger.warning(f"Repository not found: {repo_full_name}")
+            return
+        prs = repository['pullRequests']
+        if progress is None:
+            progress = tqdm(total=prs['totalCount'], desc=f"Processing {repo_full_name}")
+        for pr in prs['nodes']:
+            yield pr_record(token, repo_full_name, pr)
+        progress.update(len(prs['nodes']))
+        if not prs['pageInfo']['hasNextPage']:
+            break
+        cursor = prs['pageInfo']['endCursor']
+    progress.close()
 
-    # repo_owner, repo_name = repo_full_name.split('/')
-    # with open(f"data/paddle_prs_n/{repo_owner}_{repo_name}_prs_n.json", "w", newline="", encoding="utf-8") as f:
-    #     json.dump(pr_num_list, f, indent=4, ensure_ascii=False)
-    # try:
-    #     with open(f"data/paddle_prs_n/{owner}_{name}_prs_n.json", "r", encoding="utf-8") as f:
-    #         pr_num_list = json.load(f)
-    # except FileNotFoundError:
-    #     logging.error(f"PR numbers file not found for {owner}_{name}. Using empty list.")
-    #     return []
-    
-    
-    logger.info(f"Fetching PRs for repository: {repo_full_name}, total: {len(pr_num_list)}")
+def get_repo_prs(repo_full_name):
+    """
+    获取指定仓库的所有PR
+    """
     pr_list = []
-    
-    # 用 ThreadPoolExecutor 并行化处理 PR
-    with ThreadPoolExecutor(max_workers=3 * len(gh_list)) as executor:
-        # 分配任务到令牌 gh
-        future_to_pr = {executor.submit(fetch_pr_info, gh_list[i % len(gh_list)], repo_full_name, pr_num): pr_num for i, pr_num in enumerate(pr_num_list)}
-        # future_to_pr = {executor.submit(fetch_pr_info_graphql, token_list[i % len(token_list)], repo_full_name, pr_num): pr_num for i, pr_num in enumerate(pr_num_list)}
-
-        for future in tqdm(as_completed(future_to_pr), total=len(future_to_pr), desc=f"Processing {repo_full_name}"):
-            result = future.result()  # 获取线程结束后的结果
-            if 'error' in result:
-                logging.error(f"Error fetching PR {result['pr_number']} for repository {repo_full_name}: {result['error']}")
-            pr_list.append(result)
-
+    for result in iter_repo_prs(token_list[0], repo_full_name):
+        if 'error' in result:
+            logging.error(f"Error fetching PR {result['number']} for repository {repo_full_name}: {result['error']}")
+        pr_list.append(result)
+    logger.info(f"Fetched PRs for repository: {repo_full_name}, total: {len(pr_list)}")
     return pr_list
 
 if __name__ == "__main__":
@@ -0,0 +1,205 @@
+import os
+import json
+import logging
+import threading
+import datetime
+from pathlib import Path
+import numpy as np
+
+from utils import dataset
+
+logger = logging.getLogger(__name__)
+
+CUBE_DIR = Path("cache/health_cubes")
+# 按天统计的指标，issue/pr的状态按创建日期计入
+METRICS = (
+    "comments",
+    "reviews",
+    "issues",
+    "issues_closed",
+    "requirement_issues",
+    "requirement_issues_closed",
+    "prs",
+    "prs_merged",
+    "commits",
+)
+
+_cubes = {}  # repo -> ActivityCube，进程内缓存
+_cubes_lock = threading.Lock()
+
+def _to_days(values: list) -> np.ndarray:
+    """
+    将ISO时间字符串一次性解析为按天的datetime64数组，缺失的时间按1970-01-01处理
+    """
+    return np.array([v or "1970-01-01" for v in values], dtype="U10").astype("datetime64[D]")
+
+def _source_stat(repo_full_name: str) -> np.ndarray:
+    """
+    仓库数据文件的修改时间，用于判断预计算结果是否过期
+    """
+    stat = []
+    for kind in dataset.KINDS:
+        try:
+            stat.append(os.stat(dataset.json_path(repo_full_name, kind)).st_mtime_ns)
+        except OSError:
+            stat.append(0)
+    return np.array(stat, dtype=np.int64)
+
+def _day(value) -> np.datetime64 | None:
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        value = value.date()
+    return np.datetime64(value, "D")
+
+class ActivityCube:
+    """
+    一个仓库的每日活动表：各指标的按天计数（前缀和），以及每个贡献者的活跃日期
+    任意时间窗口的指标都只需二分查找，无需重新读取原始数据
+    """
+    def __init__(self, arrays: dict):
+        self.days = arrays["days"]
+        self.cumsum = {m: np.concatenate(([0], np.cumsum(arrays[m]))) for m in METRICS}
+        self.author_days = arrays["author_days"]  # 按日期排序的 (贡献者, 日期) 去重对
+        self.author_ids = arrays["author_ids"]
+        self.author_first = arrays["author_first"]  # 每个贡献者首次commit日期
+        self.author_last = arrays["author_last"]  # 每个贡献者最近commit日期
+        self.core_contributors = int(arrays["core_contributors"])
+        self.source = arrays["source"]
+
+    @staticmethod
+    def build(repo_full_name: str) -> dict:
+        """
+        从原始数据计算每日活动表
+        """
+        issues = dataset.load_columns(repo_full_name, 'issues', ['created_at', 'state', 'labels', 'comment_by'])
+        prs = dataset.load_columns(repo_full_name, 'prs', ['created_at', 'merged', 'comment_by', 'review_by'])
+        commits = dataset.load_columns(repo_full_name, 'commits', ['created_at', 'author', 'committer'])
+
+        issue_days = _to_days(issues['created_at'])
+        issue_closed = np.array(issues['state'], dtype=object) == "closed"
+        issue_requirement = np.array([any("feat" in label for label in labels or []) for labels in issues['labels']], dtype=bool)
+        pr_days = _to_days(prs['created_at'])
+        pr_merged = np.array(prs['merged'], dtype=object) == True
+        commit_days = _to_days(commits['created_at'])
+        # 所有评论/review的时间展开为一列
+        comment_days = _to_days([c[1] for comments in issues['comment_by'] + prs['comment_by'] for c in comments or []])
+        review_days = _to_days([r[1] for reviews in prs['review_by'] for r in reviews or []])
+
+        events = {
+            "comments": comment_days,
+            "reviews": review_days,
+            "issues": issue_days,
+            "issues_closed": issue_days[issue_closed],
+            "requirement_issues": issue_days[issue_requirement],
+            "requirement_issues_closed": issue_days[issue_requirement & issue_closed],
+            "prs": pr_days,
+            "prs_merged": pr_days[pr_merged],
+            "commits": commit_days,
+        }
+        days = np.unique(np.concatenate(list(events.values())))
+        arrays = {"days": days}
+        for metric, event_days in events.items():
+            arrays[metric] = np.bincount(np.searchsorted(days, event_days), minlength=len(days)).astype(np.int64)
+
+        # 贡献者（commit作者，None也算作一个贡献者，与原始统计一致）
+        authors = {}
+        author_ids = np.array([authors.setdefault(a, len(authors)) for a in commits['author']], dtype=np.int64)
+        pairs = np.unique(np.stack([commit_days.astype(np.int64), author_ids], axis=1), axis=0) if len(author_ids) else np.empty((0, 2), dtype=np.int64)
+        arrays["author_days"] = pairs[:, 0].astype("datetime64[D]")
+        arrays["author_ids"] = pairs[:, 1]
+        first = np.full(len(authors), np.iinfo(np.int64).max, dtype=np.int64)
+        last = np.full(len(authors), np.iinfo(np.int64).min, dtype=np.int64)
+        np.minimum.at(first, pairs[:, 1], pairs[:, 0])
+        np.maximum.at(last, pairs[:, 1], pairs[:, 0])
+        arrays["author_first"] = first.astype("datetime64[D]")
+        arrays["author_last"] = last.astype("datetime64[D]")
+
+        core_contributors = set(commits['committer'])
+        core_contributors.discard("GitHub")
+        arrays["core_contributors"] = np.int64(len(core_contributors))
+        arrays["source"] = _source_stat(repo_full_name)
+        return arrays
+
+    def _range(self, days: np.ndarray, since, until) -> tuple[int, int]:
+        lo = 0 if since is None else np.searchsorted(days, since, side="left")
+        hi = len(days) if until is None else np.searchsorted(days, until, side="right")
+        return lo, hi
+
+    def counts(self, since=None, until=None) -> dict:
+        """
+        [since, until] 内（按天，含两端，None表示不限）各指标的数量
+        """
+        lo, hi = self._range(self.days, _day(since), _day(until))
+        return {m: int(self.cumsum[m][max(hi, lo)] - self.cumsum[m][lo]) for m in METRICS}
+
+    def contributors(self, since=None, until=None) -> dict:
+        """
+        [since, until] 内的贡献者统计：活跃、新增（之前没有贡献过）、留存（之前也有贡献）以及之前的贡献者
+        """
+        since, until = _day(since), _day(until)
+        lo, hi = self._range(self.author_days, since, until)
+        active = np.unique(self.author_ids[lo:hi])
+        before = self.author_first < since if since is not None else np.zeros(len(self.author_first), dtype=bool)
+        retention = int(np.count_nonzero(before[active]))
+        return {
+            "total": len(self.author_first),
+            "active": len(active),
+            "new": len(active) - retention,
+            "retention": retention,
+            "before": int(np.count_nonzero(before)),
+        }
+
+def _cube_file(repo_full_name: str) -> Path:
+    repo_owner, repo_name = repo_full_name.split('/')
+    return CUBE_DIR / f"{repo_owner}_{repo_name}.npz"
+
+def precompute(repo_full_name: str) -> ActivityCube:
+    """
+    计算并保存一个仓库的每日活动表
+    """
+    arrays = ActivityCube.build(repo_full_name)
+    CUBE_DIR.mkdir(parents=True, exist_ok=True)
+    path = _cube_file(repo_full_name)
+    tmp = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+    np.savez(tmp, **arrays)
+    os.replace(tmp, path)
+    return ActivityCube(arrays)
+
+def load_cube(repo_full_name: str) -> ActivityCube:
+    """
+    获取仓库的每日活动表：优先用进程内缓存和预计算文件，数据文件有更新时重新计算
+    """
+    source = _source_stat(repo_full_name)
+    with _cubes_lock:
+        cube = _cubes.get(repo_full_name)
+        if cube is not None and np.array_equal(cube.source, source):
+            return cube
+    cube = None
+    path = _cube_file(repo_full_name)
+    if path.exists():
+        with np.load(path) as arrays:
+            cube = ActivityCube(dict(arrays))
+        if not np.array_equal(cube.source, source):
+            cube = None
+    if cube is None:
+        logger.info(f"Precomputing activity cube for {repo_full_name}")
+        cube = precompute(repo_full_name)
+    with _cubes_lock:
+        _cubes[repo_full_name] = cube
+    return cube
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s (PID %(process)d) [%(levelname)s] %(filename)s:%(lineno)d %(message)s",
+        level=logging.INFO,
+    )
+
+    with open(dataset.DATA_DIR / "paddle_repos.json", 'r', encoding='utf-8') as f:
+        paddle_repos = json.load(f)
+    for repo in paddle_repos:
+        try:
+            precompute(repo['full_name'])
+        except Exception as e:
+            logger.error(f"Error precomputing {repo['full_name']}: {e}")
+    print('done')
@@ -1,56 +1,76 @@
 from datetime import datetime, timedelta, timezone
 import json
 import os
+import shutil
 import subprocess
-import tempfile
 import time
 
+# 与后端 utils/git_mirror 相同的镜像目录结构；健康度命令行在 backend/health 下运行，不依赖后端的模块和配置
+MIRROR_DIR = os.getenv("MIRROR_DIR", "cache/mirrors")
 
-def clone_repo(owner, repo):
-    repo_url = f"git@github.com:{owner}/{repo}.git"
-    with tempfile.TemporaryDirectory() as tmpdir:
-        target_dir = os.path.join(tmpdir, f"{owner}_{repo}")
-        subprocess.run(["git", "clone", repo_url, target_dir], check=True)
-
-        # 构造 git log 命令
-        cmd = [
-            "git",
-            "log",
-            "--pretty=format:%H|%ad|%an|%cn|%f",
-            "--date=iso",
-        ]
 
-        # 执行命令，指定 UTF-8 编码，忽略非法字符
-        result = subprocess.run(
-            cmd,
-            cwd=target_dir,
-            capture_output=True,
-            text=True,
-            encoding="utf-8",
-            errors="ignore",
-            check=True,
+def sync_mirror(owner, repo):
+    # 不含文件内容的bare镜像（--filter=blob:none），首次clone，之后只fetch新的commit；只同步分支和tag
+    path = os.path.join(MIRROR_DIR, f"{owner}_{repo}.git")
+    if os.path.exists(path):
+        subprocess.run(["git", "-C", path, "fetch", "--quiet", "--prune", "--tags", "origin"], check=True)
+        return path
+
+    os.makedirs(MIRROR_DIR, exist_ok=True)
+    tmp_path = path + ".tmp"  # clone完成后再改名，中断时不会留下不完整的镜像
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    subprocess.run(
+        ["git", "clone", "--quiet", "--bare", "--filter=blob:none", f"git@github.com:{owner}/{repo}.git", tmp_path],
+        check=True,
+    )
+    subprocess.run(["git", "-C", tmp_path, "config", "remote.origin.fetch", "+refs/heads/*:refs/heads/*"], check=True)
+    os.replace(tmp_path, path)
+    return path
+
+
+def clone_repo(owner, repo):
+    # 只读取commit信息，不需要下载文件
+    target_dir = sync_mirror(owner, repo)
+
+    # 构造 git log 命令
+    cmd = [
+        "git",
+        "log",
+        "--pretty=format:%H|%ad|%an|%cn|%f",
+        "--date=iso",
+    ]
+
+    # 执行命令，指定 UTF-8 编码，忽略非法字符
+    result = subprocess.run(
+        cmd,
+        cwd=target_dir,
+        capture_output=True,
+        text=True,
+        encoding="utf-8",
+        errors="ignore",
+        check=True,
+    )
+
+    # 解析输出并构建 JSON
+    commits = []
+    for line in result.stdout.splitlines():
+        sha, created_at, author, committer, message = line.split("|", 4)
+        commits.append(
+            {
+                "repo": f"{owner}/{repo}",
+                "sha": sha,
+                "created_at": created_at,
+                "author": author,
+                "committer": committer,
+                "message": message,
+            }
         )
 
-        # 解析输出并构建 JSON
-        commits = []
-        for line in result.stdout.splitlines():
-            sha, created_at, author, committer, message = line.split("|", 4)
-            commits.append(
-                {
-                    "repo": f"{owner}/{repo}",
-                    "sha": sha,
-                    "created_at": created_at,
-                    "author": author,
-                    "committer": committer,
-                    "message": message,
-                }
-            )
-
-        # 保存到文件
-        file_name = f"./commit_jsons/{owner}/{repo}_commits.json"
-        os.makedirs(os.path.dirname(file_name), exist_ok=True)
-        with open(file_name, "w", encoding="utf-8") as f:
-            json.dump(commits, f, ensure_ascii=False, indent=2)
+    # 保存到文件
+    file_name = f"./commit_jsons/{owner}/{repo}_commits.json"
+    os.makedirs(os.path.dirname(file_name), exist_ok=True)
+    with open(file_name, "w", encoding="utf-8") as f:
+        json.dump(commits, f, ensure_ascii=False, indent=2)
 
 
 def fetch_commit_count(owner, repo, days=None):
@@ -5,7 +5,10 @@ import tempfile
 from bs4 import BeautifulSoup
 import requests
 
+from utils import metrics
 
+
+@metrics.timed("health", "dependents")
 def fetch_dependents_from_html(owner, repo):
     url = f"https://github.com/{owner}/{repo}/network/dependents"
     headers = {
@@ -16,6 +19,7 @@ def fetch_dependents_from_html(owner, repo):
 
     # 请求页面
     r = requests.get(url, headers=headers)
+    metrics.github_response("dependents", r)
     if r.status_code != 200:
         raise Exception(f"请求失败: {r.status_code}")
 
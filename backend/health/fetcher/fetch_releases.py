@@ -1,10 +1,15 @@
 from datetime import datetime, timedelta, timezone
 from config import NOWDATE, GITHUB_TOKEN
+from utils import metrics
 
 import requests
 
 
-def fetch_total_releases(owner, repo, days=None):
+@metrics.timed("health", "releases")
+def fetch_release_dates(owner, repo):
+    """
+    获取仓库在NOWDATE之前所有release的创建时间
+    """
     all_releases = []
     headers = {
         "Accept": "application/vnd.github.v3+json",
@@ -17,6 +22,7 @@ def fetch_total_releases(owner, repo, days=None):
     }
     while True:
         r = requests.get(url, headers=headers, params=params)
+        metrics.github_response("releases", r)
         r.raise_for_status()
         data = r.json()
 
@@ -26,21 +32,25 @@ def fetch_total_releases(owner, repo, days=None):
         all_releases.extend(data)
         params["page"] += 1
 
-    all_releases = [release for release in all_releases if datetime.fromisoformat(release["created_at"].replace("Z", "+00:00")) <= NOWDATE]
-    total_count = len(all_releases)
+    created = [datetime.fromisoformat(release["created_at"].replace("Z", "+00:00")) for release in all_releases]
+    return [c for c in created if c <= NOWDATE]
+
 
+def count_releases(release_dates, since=None, until=None):
+    """
+    统计release总数和 [since, until] 内的数量
+    """
+    total_count = len(release_dates)
     recent_count = 0
+    if since:
+        recent_count = sum(1 for created in release_dates
+                           if created >= since and (until is None or created.date() <= until))
+    return total_count, recent_count
 
-    if days:
-        since_date = NOWDATE - timedelta(days=days)
-        for release in all_releases:
-            created = datetime.fromisoformat(
-                release["created_at"].replace("Z", "+00:00")
-            )
-            if created >= since_date:
-                recent_count += 1
 
-    return total_count, recent_count
+def fetch_total_releases(owner, repo, days=None):
+    since_date = NOWDATE - timedelta(days=days) if days else None
+    return count_releases(fetch_release_dates(owner, repo), since_date)
 
 
 if __name__ == "__main__":
@@ -1,20 +1,53 @@
+import copy
 import datetime
 import json
+import logging
+import os
 
-from config import NOWDATE
-from health.fetcher.fetch_releases import fetch_total_releases
+from config import NOWDATE, RESULT_CACHE_DIR, NETWORK_CACHE_TTL
+from health.fetcher.fetch_releases import fetch_release_dates, count_releases
 from health.fetcher.fetch_dependents import fetch_dependents_from_html
+from health.activity_cube import load_cube
+from utils import dataset, metrics
+from utils.result_cache import ResultCache
 
+logger = logging.getLogger(__name__)
 
 DATA_DIR = "data"
 
+# 本地指标结果缓存，以及release、dependents等网络数据的缓存
+_local_results = ResultCache(maxsize=256, disk_dir=os.path.join(RESULT_CACHE_DIR, "health") if RESULT_CACHE_DIR else None,
+                            name="health_local")
+_network_results = ResultCache(maxsize=256, ttl=NETWORK_CACHE_TTL, disk_dir=os.path.join(RESULT_CACHE_DIR, "network") if RESULT_CACHE_DIR else None,
+                              name="health_network")
+
+def _cached_network(key, fetch):
+    """
+    获取网络数据，缓存过期后重新获取；获取失败时使用过期的缓存
+    """
+    value = _network_results.get(key)
+    if value is not None:
+        return value
+    try:
+        value = fetch()
+    except Exception as e:
+        value = _network_results.get(key, stale=True)
+        if value is None:
+            raise
+        logger.warning(f"Refreshing {key} failed, using stale value: {e}")
+        return value
+    _network_results.set(key, value)
+    return value
+
 class HealthAnalyzer:
     """
     分析飞桨项目的健康度
     """
-    def __init__(self, repo: str, days: int = 90):
+    STAGES = ('local', 'network')  # 分析的各阶段，用于报告进度
+
+    def __init__(self, repo: str, days: int = 90, since: datetime.date | None = None, until: datetime.date | None = None):
         """
-        初始化
+        初始化，近期默认为NOWDATE前days天以来；也可以用since/until指定任意时间范围
         """
         owner, name = repo.split("/")
         # 检查repo是否在飞桨里
@@ -27,8 +60,9 @@ class HealthAnalyzer:
         self.owner = owner
         self.repo_name = name
         self.dir = f"{owner}_{name}"
-        self.days = days
-        self.recent = NOWDATE - datetime.timedelta(days=days)
+        self.recent = NOWDATE - datetime.timedelta(days=days) if since is None else datetime.datetime.combine(since, datetime.time(), NOWDATE.tzinfo)
+        self.until = until
+        self.days = (NOWDATE.date() - self.recent.date()).days
         self.scores = {
             "vigor": {
                 "communication activity": {
@@ -166,132 +200,80 @@ class HealthAnalyzer:
         }
 
     
-    def analyze_health(self):
+    @metrics.timed("health", "local")
+    def _analyze_local(self):
         """
-        分析健康度，返回健康度结果。
+        基于本地数据计算的指标
         """
 
-        # 读取本地数据
-        with open(f"{DATA_DIR}/paddle_issues/{self.dir}_issues.json", 'r', encoding='utf-8') as f:
-            issues = json.load(f)
-        with open(f"{DATA_DIR}/paddle_prs/{self.dir}_prs.json", 'r', encoding='utf-8') as f:
-            prs = json.load(f)
-        with open(f"{DATA_DIR}/paddle_commits/{self.dir}_commits.json", 'r', encoding='utf-8') as f:
-            commits = json.load(f)
+        # 读取预计算的每日活动表，总量和近期数量都是前缀和查询
+        with metrics.timer("health", "activity_cube"):
+            cube = load_cube(f"{self.owner}/{self.repo_name}")
+            total = cube.counts()
+            recent = cube.counts(self.recent, self.until)
 
         #  ---vigor---
         #  1)communication activity
         #    a)number of comments
-        total_issue_comments = sum(len(issue.get("comment_by", [])) for issue in issues)
-        total_pr_comments = sum(len(pr.get("comment_by", [])) for pr in prs)
-        self.scores["vigor"]["communication activity"]["number of comments"]["total"] = total_issue_comments + total_pr_comments
-        recent_issue_comments = 0
-        for issue in issues:
-            recent_issue_comments += sum(1 for comment in issue.get("comment_by", [])
-                if datetime.datetime.fromisoformat(comment[1][:10]).date() >= self.recent.date()
-            )
-        recent_pr_comments = 0
-        for pr in prs:
-            recent_pr_comments += sum(1 for comment in pr.get("comment_by", [])
-                if datetime.datetime.fromisoformat(comment[1][:10]).date() >= self.recent.date()
-            )
-        self.scores["vigor"]["communication activity"]["number of comments"]["recent"] = recent_issue_comments + recent_pr_comments
+        self.scores["vigor"]["communication activity"]["number of comments"]["total"] = total["comments"]
+        self.scores["vigor"]["communication activity"]["number of comments"]["recent"] = recent["comments"]
         #    b)number of issues
-        total_issues = len(issues)
-        self.scores["vigor"]["communication activity"]["number of issues"]["total"] = total_issues
-        recent_issues = sum(1 for issue in issues if datetime.datetime.fromisoformat(issue.get("created_at", "1970-01-01T00:00:00+00:00")[:10]).date() >= self.recent.date())
-        self.scores["vigor"]["communication activity"]["number of issues"]["recent"] = recent_issues
+        self.scores["vigor"]["communication activity"]["number of issues"]["total"] = total["issues"]
+        self.scores["vigor"]["communication activity"]["number of issues"]["recent"] = recent["issues"]
 
         #  2)development activity
         #    a)core developer activity-number of core developer reviews
-        total_reviews = sum(len(pr.get("review_by", [])) for pr in prs)
-        self.scores["vigor"]["development activity"]["core developer activity"]["number of core developer reviews"]["total"] = total_reviews
-        recent_reviews = 0
-        for pr in prs:
-            recent_reviews += sum(1 for review in pr.get("review_by", [])
-                if datetime.datetime.fromisoformat(review[1][:10]).date() >= self.recent.date()
-            )
-        self.scores["vigor"]["development activity"]["core developer activity"]["number of core developer reviews"]["recent"] = recent_reviews
+        self.scores["vigor"]["development activity"]["core developer activity"]["number of core developer reviews"]["total"] = total["reviews"]
+        self.scores["vigor"]["development activity"]["core developer activity"]["number of core developer reviews"]["recent"] = recent["reviews"]
         #    b)overall development activity
         #       i)number of pull requests
-        total_prs = len(prs)
-        self.scores["vigor"]["development activity"]["overall development activity"]["number of pull requests"]["total"] = total_prs
-        recent_prs = sum(1 for pr in prs if datetime.datetime.fromisoformat(pr.get("created_at", "1970-01-01T00:00:00+00:00")[:10]).date() >= self.recent.date())
-        self.scores["vigor"]["development activity"]["overall development activity"]["number of pull requests"]["recent"] = recent_prs
+        self.scores["vigor"]["development activity"]["overall development activity"]["number of pull requests"]["total"] = total["prs"]
+        self.scores["vigor"]["development activity"]["overall development activity"]["number of pull requests"]["recent"] = recent["prs"]
         #       ii)number of commits
-        total_commits = len(commits)
-        self.scores["vigor"]["development activity"]["overall development activity"]["number of commits"]["total"] = total_commits
-        recent_commits = sum(1 for commit in commits if datetime.datetime.fromisoformat(commit.get("created_at", "1970-01-01T00:00:00+00:00")[:10]).date() >= self.recent.date())
-        self.scores["vigor"]["development activity"]["overall development activity"]["number of commits"]["recent"] = recent_commits
+        self.scores["vigor"]["development activity"]["overall development activity"]["number of commits"]["total"] = total["commits"]
+        self.scores["vigor"]["development activity"]["overall development activity"]["number of commits"]["recent"] = recent["commits"]
         #       iii)requirement completion ratio
-        requirement_issues = [
-            issue for issue in issues
-            if any("feat" in label for label in issue.get("labels", []))
-        ]
-        total_requirement_issues = len(requirement_issues)
-        total_closed_requirement_issues = sum(1 for issue in requirement_issues if issue.get("state", "") == "closed")
-        self.scores["vigor"]["development activity"]["overall development activity"]["requirement completion ratio"]["number of requirement issues"]["total"] = total_requirement_issues
-        self.scores["vigor"]["development activity"]["overall development activity"]["requirement completion ratio"]["number of requirement issues closed"]["total"] = total_closed_requirement_issues
-        self.scores["vigor"]["development activity"]["overall development activity"]["requirement completion ratio"]["ratio"]["total"] = total_closed_requirement_issues / total_requirement_issues if total_requirement_issues > 0 else 0
-        recent_requirement_issues = sum(1 for issue in requirement_issues if datetime.datetime.fromisoformat(issue.get("created_at", "1970-01-01T00:00:00+00:00")[:10]).date() >= self.recent.date())
-        recent_closed_requirement_issues = sum(1 for issue in requirement_issues if issue.get("state", "") == "closed" and datetime.datetime.fromisoformat(issue.get("created_at", "1970-01-01T00:00:00+00:00")[:10]).date() >= self.recent.date())
-        self.scores["vigor"]["development activity"]["overall development activity"]["requirement completion ratio"]["number of requirement issues"]["recent"] = recent_requirement_issues
-        self.scores["vigor"]["development activity"]["overall development activity"]["requirement completion ratio"]["number of requirement issues closed"]["recent"] = recent_closed_requirement_issues
-        self.scores["vigor"]["development activity"]["overall development activity"]["requirement completion ratio"]["ratio"]["recent"] = recent_closed_requirement_issues / recent_requirement_issues if recent_requirement_issues > 0 else 0
-
-        #  3)release activity
-        total_release_count, recent_release_count = fetch_total_releases(self.owner, self.repo_name, self.days)
-        self.scores["vigor"]["release activity"]["number of releases"]["total"] = total_release_count
-        self.scores["vigor"]["release activity"]["number of releases"]["recent"] = recent_release_count
+        self.scores["vigor"]["development activity"]["overall development activity"]["requirement completion ratio"]["number of requirement issues"]["total"] = total["requirement_issues"]
+        self.scores["vigor"]["development activity"]["overall development activity"]["requirement completion ratio"]["number of requirement issues closed"]["total"] = total["requirement_issues_closed"]
+        self.scores["vigor"]["development activity"]["overall development activity"]["requirement completion ratio"]["ratio"]["total"] = total["requirement_issues_closed"] / total["requirement_issues"] if total["requirement_issues"] > 0 else 0
+        self.scores["vigor"]["development activity"]["overall development activity"]["requirement completion ratio"]["number of requirement issues"]["recent"] = recent["requirement_issues"]
+        self.scores["vigor"]["development activity"]["overall development activity"]["requirement completion ratio"]["number of requirement issues closed"]["recent"] = recent["requirement_issues_closed"]
+        self.scores["vigor"]["development activity"]["overall development activity"]["requirement completion ratio"]["ratio"]["recent"] = recent["requirement_issues_closed"] / recent["requirement_issues"] if recent["requirement_issues"] > 0 else 0
 
         #  ---organization---
         #  1)size
         #    a)number of contributors
-        all_contributors = set(commit["author"] for commit in commits)
-        self.scores["organization"]["size"]["number of contributors"]["total"] = len(all_contributors)
-        recent_contributors = set(commit["author"] for commit in commits
-            if datetime.datetime.fromisoformat(commit.get("created_at", "1970-01-01T00:00:00+00:00")[:10]).date() >= self.recent.date()
-        )
-        self.scores["organization"]["size"]["number of contributors"]["recent"] = len(recent_contributors)
+        contributors = cube.contributors(self.recent, self.until)
+        self.scores["organization"]["size"]["number of contributors"]["total"] = contributors["total"]
+        self.scores["organization"]["size"]["number of contributors"]["recent"] = contributors["active"]
         #    b)number of core contributors
-        core_contributors = set(commit["committer"] for commit in commits)
-        core_contributors.discard("GitHub")
-        self.scores["organization"]["size"]["number of core contributors"] = len(core_contributors)
+        self.scores["organization"]["size"]["number of core contributors"] = cube.core_contributors
 
         #  2)diversity
         #    a)acceptence rate of pull requests
-        total_merged_prs = sum(1 for pr in prs if pr.get("merged", False) == True)
-        self.scores["organization"]["diversity"]["experience"]["acceptence rate of pull requests"]["number of merged pull requests"]["total"] = total_merged_prs
-        self.scores["organization"]["diversity"]["experience"]["acceptence rate of pull requests"]["number of pull requests"]["total"] = total_prs
-        self.scores["organization"]["diversity"]["experience"]["acceptence rate of pull requests"]["ratio"]["total"] = total_merged_prs / total_prs if total_prs > 0 else 0
-        recent_merged_prs = sum(1 for pr in prs if pr.get("merged", False) == True and datetime.datetime.fromisoformat(pr.get("created_at", "1970-01-01T00:00:00+00:00")[:10]).date() >= self.recent.date())
-        self.scores["organization"]["diversity"]["experience"]["acceptence rate of pull requests"]["number of merged pull requests"]["recent"] = recent_merged_prs
-        self.scores["organization"]["diversity"]["experience"]["acceptence rate of pull requests"]["number of pull requests"]["recent"] = recent_prs
-        self.scores["organization"]["diversity"]["experience"]["acceptence rate of pull requests"]["ratio"]["recent"] = recent_merged_prs / recent_prs if recent_prs > 0 else 0
+        self.scores["organization"]["diversity"]["experience"]["acceptence rate of pull requests"]["number of merged pull requests"]["total"] = total["prs_merged"]
+        self.scores["organization"]["diversity"]["experience"]["acceptence rate of pull requests"]["number of pull requests"]["total"] = total["prs"]
+        self.scores["organization"]["diversity"]["experience"]["acceptence rate of pull requests"]["ratio"]["total"] = total["prs_merged"] / total["prs"] if total["prs"] > 0 else 0
+        self.scores["organization"]["diversity"]["experience"]["acceptence rate of pull requests"]["number of merged pull requests"]["recent"] = recent["prs_merged"]
+        self.scores["organization"]["diversity"]["experience"]["acceptence rate of pull requests"]["number of pull requests"]["recent"] = recent["prs"]
+        self.scores["organization"]["diversity"]["experience"]["acceptence rate of pull requests"]["ratio"]["recent"] = recent["prs_merged"] / recent["prs"] if recent["prs"] > 0 else 0
         #    b)close rate of issues
-        total_closed_issues = sum(1 for issue in issues if issue.get("state", "") == "closed")
-        self.scores["organization"]["diversity"]["experience"]["close rate of issues"]["number of issues closed"]["total"] = total_closed_issues
-        self.scores["organization"]["diversity"]["experience"]["close rate of issues"]["number of issues"]["total"] = total_issues
-        self.scores["organization"]["diversity"]["experience"]["close rate of issues"]["ratio"]["total"] = total_closed_issues / total_issues if total_issues > 0 else 0
-        recent_closed_issues = sum(1 for issue in issues if issue.get("state", "") == "closed" and datetime.datetime.fromisoformat(issue.get("created_at", "1970-01-01T00:00:00+00:00")[:10]).date() >= self.recent.date())
-        self.scores["organization"]["diversity"]["experience"]["close rate of issues"]["number of issues closed"]["recent"] = recent_closed_issues
-        self.scores["organization"]["diversity"]["experience"]["close rate of issues"]["number of issues"]["recent"] = recent_issues
-        self.scores["organization"]["diversity"]["experience"]["close rate of issues"]["ratio"]["recent"] = recent_closed_issues / recent_issues if recent_issues > 0 else 0
+        self.scores["organization"]["diversity"]["experience"]["close rate of issues"]["number of issues closed"]["total"] = total["issues_closed"]
+        self.scores["organization"]["diversity"]["experience"]["close rate of issues"]["number of issues"]["total"] = total["issues"]
+        self.scores["organization"]["diversity"]["experience"]["close rate of issues"]["ratio"]["total"] = total["issues_closed"] / total["issues"] if total["issues"] > 0 else 0
+        self.scores["organization"]["diversity"]["experience"]["close rate of issues"]["number of issues closed"]["recent"] = recent["issues_closed"]
+        self.scores["organization"]["diversity"]["experience"]["close rate of issues"]["number of issues"]["recent"] = recent["issues"]
+        self.scores["organization"]["diversity"]["experience"]["close rate of issues"]["ratio"]["recent"] = recent["issues_closed"] / recent["issues"] if recent["issues"] > 0 else 0
 
         #  ---resilience---
         #  1)attraction
-        previous_contributors = set(commit["author"] for commit in commits
-            if datetime.datetime.fromisoformat(commit.get("created_at", "1970-01-01T00:00:00+00:00")[:10]).date() < self.recent.date()
-        )
-        new_contributors = recent_contributors - previous_contributors
-        self.scores["resilience"]["attraction"]["new contributor rate"]["number of new contributors"] = len(new_contributors)
-        self.scores["resilience"]["attraction"]["new contributor rate"]["number of contributors"] = len(recent_contributors)
-        self.scores["resilience"]["attraction"]["new contributor rate"]["ratio"] = len(new_contributors) / len(recent_contributors) if len(recent_contributors) > 0 else 0
+        self.scores["resilience"]["attraction"]["new contributor rate"]["number of new contributors"] = contributors["new"]
+        self.scores["resilience"]["attraction"]["new contributor rate"]["number of contributors"] = contributors["active"]
+        self.scores["resilience"]["attraction"]["new contributor rate"]["ratio"] = contributors["new"] / contributors["active"] if contributors["active"] > 0 else 0
         #  2)retention
-        retention_contributors = recent_contributors & previous_contributors
-        self.scores["resilience"]["retention"]["contributor retention rate"]["number of retention contributors"] = len(retention_contributors)
-        self.scores["resilience"]["retention"]["contributor retention rate"]["number of contributors before"] = len(previous_contributors)
-        self.scores["resilience"]["retention"]["contributor retention rate"]["ratio"] = len(retention_contributors) / len(previous_contributors) if len(previous_contributors) > 0 else 0
+        self.scores["resilience"]["retention"]["contributor retention rate"]["number of retention contributors"] = contributors["retention"]
+        self.scores["resilience"]["retention"]["contributor retention rate"]["number of contributors before"] = contributors["before"]
+        self.scores["resilience"]["retention"]["contributor retention rate"]["ratio"] = contributors["retention"] / contributors["before"] if contributors["before"] > 0 else 0
 
         #  ---services---
         #  value-popularity
@@ -303,9 +285,44 @@ class HealthAnalyzer:
             self.scores["services"]["value"]["popularity"]["forks"] = repo_info.get("forks_count", 0)
             self.scores["services"]["value"]["popularity"]["watches"] = repo_info.get("watchers_count", 0)
 
-        total_dependents_count = fetch_dependents_from_html(self.owner, self.repo_name)
+    @metrics.timed("health", "network")
+    def _analyze_network(self):
+        """
+        需要访问GitHub的指标（release、dependents），结果按NETWORK_CACHE_TTL缓存
+        """
+        #  ---vigor---
+        #  3)release activity
+        release_dates = _cached_network(("releases", self.owner, self.repo_name, NOWDATE.isoformat()),
+                                        lambda: fetch_release_dates(self.owner, self.repo_name))
+        total_release_count, recent_release_count = count_releases(release_dates, self.recent, self.until)
+        self.scores["vigor"]["release activity"]["number of releases"]["total"] = total_release_count
+        self.scores["vigor"]["release activity"]["number of releases"]["recent"] = recent_release_count
+
+        #  ---services---
+        #  value-popularity
+        total_dependents_count = _cached_network(("dependents", self.owner, self.repo_name),
+                                                 lambda: fetch_dependents_from_html(self.owner, self.repo_name))
         self.scores["services"]["value"]["popularity"]["dependents"] = total_dependents_count
 
+    def analyze_health(self, progress=None):
+        """
+        分析健康度，返回健康度结果。
+        本地数据计算的指标按 (仓库, 时间范围, NOWDATE, 数据集版本) 缓存，网络指标单独按TTL刷新
+        progress(stage) 在进入每个阶段时调用
+        """
+        progress = progress or (lambda stage: None)
+        progress('local')
+        key = (f"{self.owner}/{self.repo_name}", self.recent.date().isoformat(), str(self.until),
+               NOWDATE.isoformat(), dataset.dataset_version())
+        scores = _local_results.get(key)
+        if scores is None:
+            self._analyze_local()
+            _local_results.set(key, copy.deepcopy(self.scores))
+        else:
+            self.scores = copy.deepcopy(scores)
+        progress('network')
+        self._analyze_network()
+
         return {
             "date": NOWDATE.strftime("%Y-%m-%d"),
             "scores": self.scores
@@ -7,6 +7,9 @@ import sys
 from dotenv import load_dotenv
 import requests
 
+# 部分指标（release、核心贡献者、dependents）与后端共用 config 和 utils，从 backend/health 下运行时也能导入
+sys.path.insert(1, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
 save_count = 0
 
 TEMP_DIR = "temp_data"
@@ -1,43 +1,51 @@
-import numpy as np
-import uuid
 import datetime
-import pandas as pd
-import base64
-import plotly.graph_objects as go
-from fastapi import FastAPI, HTTPException
+import json
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, Response
 from pydantic import BaseModel
-from skills.developer_analyzer import DeveloperAnalyzer
-from health.health_analyzer import HealthAnalyzer
+# 开发者分析（plotly、matplotlib、wordcloud、pandas等）和健康度分析（numpy等）依赖较重，在接口中按需导入
 from collarboration.governance_analyzer import GovernanceAnalyzer
+from utils import dataset, serialize, artifacts, web, warmup, metrics, profiling
+from utils.serialize import ORJSONResponse
+from utils.scratch import scratch
+from utils.jobs import jobs, JobQueueFull
+from config import NOWDATE, NETWORK_CACHE_TTL, WARMUP, BATCH_DIR
 
-def clean_data(obj):
-    """
-    递归清理数据，确保所有数据类型都可以被JSON序列化
-    """
-    if isinstance(obj, go.Figure):
-        return clean_data(obj.to_dict()) # plotly图片先转dict，再处理dict中的每一项
-    elif isinstance(obj, bytes):
-        return base64.b64encode(obj).decode()
-    elif isinstance(obj, (np.integer, np.int32, np.int64, np.uint32, np.uint64)):
-        return int(obj)
-    elif isinstance(obj, (np.floating, np.float32, np.float64)):
-        return float(obj)
-    elif isinstance(obj, (np.ndarray,)):
-        return [clean_data(o) for o in obj.tolist()]
-    elif isinstance(obj, (pd.Timestamp, datetime.datetime)):
-        return obj.isoformat()
-    elif isinstance(obj, (pd.Timedelta, datetime.timedelta)):
-        return str(obj)
-    elif isinstance(obj, (dict,)):
-        return {clean_data(k): clean_data(v) for k, v in obj.items()}  # 处理dict中的每一项
-    elif isinstance(obj, (list, tuple, set)):  # 处理list/tuple/set中的每一项
-        return [clean_data(v) for v in obj]
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    worker启动时在后台预热（映射arrow数据快照、建立索引、加载各类缓存），完成后 /ready 返回就绪；
+    并在后台定期清理临时目录
+    """
+    if WARMUP:
+        warmup.start(WARMUP)
     else:
-        return obj
+        warmup.state["ready"] = True
+    scratch.start()
+    artifacts.space.start()
+    if profiling.ENABLED:
+        profiling.space.start()
+    yield
+    scratch.stop()
+    artifacts.space.stop()
+    profiling.space.stop()
+    jobs.shutdown()
+
+app = FastAPI(lifespan=lifespan)
 
-app = FastAPI()
+# 按Accept-Encoding压缩响应（br/gzip）
+app.add_middleware(web.CompressionMiddleware)
+
+# 按路由统计请求耗时（在压缩之外，包括压缩的耗时）
+app.add_middleware(metrics.MetricsMiddleware)
+
+# 抽样或按请求头做性能分析（PROFILE_SAMPLE_RATE / PROFILE_HEADER），未开启时不安装
+if profiling.ENABLED:
+    app.add_middleware(profiling.ProfilingMiddleware)
 
 # 允许跨域（可用于开发环境，生产环境需要限制）
 app.add_middleware(
@@ -49,10 +57,35 @@ app.add_middleware(
     allow_headers=["*"]
 )
 
+def response_etag(*parts) -> str:
+    """
+    分析结果的ETag：NOWDATE、数据集版本、github数据的缓存周期和请求参数都不变时，结果不变
+    """
+    return web.etag(NOWDATE.isoformat(), dataset.dataset_version(), int(time.time() // NETWORK_CACHE_TTL), *parts)
+
 @app.get("/")
 def read_root():
     return {"message": "Welcome to PaddleLens!"}
 
+@app.get("/ready")
+def ready():
+    """
+    预热完成后返回200，否则返回503（供负载均衡判断是否转发流量）；预热失败的阶段在 degraded 中列出，不影响就绪
+    """
+    return JSONResponse(content=warmup.state, status_code=200 if warmup.state["ready"] else 503)
+
+@app.get("/metrics")
+def prometheus_metrics():
+    """
+    Prometheus指标：请求和各分析阶段的耗时、github请求数和剩余限额、结果缓存命中、临时目录占用
+    未安装prometheus_client时返回503
+    """
+    if not metrics.prometheus_client:
+        raise HTTPException(status_code=503, detail="prometheus_client未安装")
+    metrics.scratch_usage("scratch", scratch.stats())
+    metrics.scratch_usage("artifacts", artifacts.space.stats())
+    return Response(content=metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/favicon.ico")
 def ignore_favicon():
     return ""
@@ -60,46 +93,107 @@ def ignore_favicon():
 # 程序员能力度量
 class UserAnalyzeRequest(BaseModel):
     github_user: str
+    artifacts: bool = False  # 为True时图片以 /artifacts/ 地址返回
 
 @app.post("/dvpr_skills/")
-def analyze_skills(request_data: UserAnalyzeRequest) -> dict:
+@profiling.profiled
+def analyze_skills(request_data: UserAnalyzeRequest, request: Request) -> dict:
     """
-    分析开发者技能，返回技能分析结果。
+    分析开发者技能，返回技能分析结果。结果未变化（If-None-Match匹配）时返回304。
     """
+    etag = response_etag("dvpr_skills", request_data.model_dump_json())
+    if web.not_modified(request.headers, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    from skills.developer_analyzer import DeveloperAnalyzer
     username = request_data.github_user
     analyzer = DeveloperAnalyzer(username)
-    result = analyzer.analyze_skills()
-    result = clean_data(result)
+    result = analyzer.analyze_skills(artifacts=request_data.artifacts)
+
+    return ORJSONResponse(content=result, headers={"ETag": etag})
+
+@app.post("/dvpr_skills/stream")
+def stream_skills(request_data: UserAnalyzeRequest):
+    """
+    以server-sent events逐部分返回技能分析结果（username, basic_info, experience, hardskill, softskill），
+    每部分算好后立即发送，最后发送end事件；出错时发送error事件。
+    """
+    from skills.developer_analyzer import DeveloperAnalyzer
+    username = request_data.github_user
+
+    def events():
+        try:
+            for section, value in DeveloperAnalyzer(username).iter_skills():
+                yield f"event: {section}\ndata: {serialize.dumps(value).decode()}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)}, ensure_ascii=False)}\n\n"
+            return
+        yield "event: end\ndata: {}\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/artifacts/{name}")
+def get_artifact(name: str, request: Request):
+    """
+    按内容寻址的图片文件（plotly图json或png），内容不变地址不变，可长期缓存
+    """
+    path = artifacts.path(name)
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail=f"文件不存在：{name}")
+    etag = f'"{name.split(".")[0]}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if web.not_modified(request.headers, etag):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=artifacts.MEDIA_TYPES[name.split(".")[1]], headers=headers)
 
-    return JSONResponse(content=result)
+@app.get("/profiles/{request_id}")
+def get_profile(request_id: str):
+    """
+    请求的性能分析结果（speedscope格式，可在 https://www.speedscope.app 打开），id为响应头 X-Profile-Id
+    """
+    path = profiling.path(request_id)
+    if path is None or not path.exists():
+        raise HTTPException(status_code=404, detail=f"性能分析结果不存在：{request_id}")
+    return FileResponse(path, media_type="application/json")
 
 # 项目群体协同-治理度分析
 @app.get("/governance/")
-def governance_analysis() -> dict:
+@profiling.profiled
+def governance_analysis(request: Request) -> dict:
     """
-    展示项目治理度，返回治理度分析结果。
+    展示项目治理度，返回治理度分析结果。评分文件未变化（If-None-Match匹配）时返回304。
     """
+    etag = web.etag(NOWDATE.isoformat(), dataset.paths_version([Path("data/governance_scores")]))
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if web.not_modified(request.headers, etag):
+        return Response(status_code=304, headers=headers)
     analyzer = GovernanceAnalyzer()
     result = analyzer.analyze_governance()
-    result = clean_data(result)
 
-    return JSONResponse(content=result)
+    return ORJSONResponse(content=result, headers=headers)
 
 # 健康度分析
 class RepoAnalyzeRequest(BaseModel):
     github_repo: str
+    days: int = 90  # 近期的天数
+    since: datetime.date | None = None  # 自定义近期范围，优先于days
+    until: datetime.date | None = None
 
 @app.post("/health/")
-def health_analysis(request_data: RepoAnalyzeRequest) -> dict:
+@profiling.profiled
+def health_analysis(request_data: RepoAnalyzeRequest, request: Request) -> dict:
     """
-    分析项目健康度，返回健康度分析结果。
+    分析项目健康度，返回健康度分析结果。结果未变化（If-None-Match匹配）时返回304。
     """
+    etag = response_etag("health", request_data.model_dump_json())
+    if web.not_modified(request.headers, etag):
+        return Response(status_code=304, headers={"ETag": etag})
+    from health.health_analyzer import HealthAnalyzer
     reponame = request_data.github_repo
     try:
-        analyzer = HealthAnalyzer(reponame)
+        analyzer = HealthAnalyzer(reponame, request_data.days, request_data.since, request_data.until)
         result = analyzer.analyze_health()
-        result = clean_data(result)
-        return JSONResponse(content=result)
+        return ORJSONResponse(content=result, headers={"ETag": etag})
     except ValueError as e:
         # 捕获 ValueError 并返回 400 Bad Request
         raise HTTPException(status_code=400, detail=str(e))
@@ -107,6 +201,77 @@ def health_analysis(request_data: RepoAnalyzeRequest) -> dict:
         # 捕获所有其他异常，并返回 500 Internal Server Error
         raise HTTPException(status_code=500, detail=f"服务器内部错误：{str(e)}")
 
+# 后台任务：提交后立即返回job_id，通过 /jobs/{job_id} 查询进度和结果
+def submit_job(kind: str, fn, stages: tuple[str, ...], batch: bool = False) -> dict:
+    try:
+        job = jobs.submit(kind, fn, stages, batch)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    return JSONResponse(content={"job_id": job.id}, status_code=202)
+
+@app.post("/jobs/dvpr_skills/")
+def submit_skills_job(request_data: UserAnalyzeRequest) -> dict:
+    """
+    提交开发者技能分析任务
+    """
+    from skills.developer_analyzer import DeveloperAnalyzer
+    username = request_data.github_user
+    return submit_job("dvpr_skills",
+                      lambda job: DeveloperAnalyzer(username).analyze_skills(progress=job.set_stage),
+                      DeveloperAnalyzer.STAGES)
+
+@app.post("/jobs/health/")
+def submit_health_job(request_data: RepoAnalyzeRequest) -> dict:
+    """
+    提交项目健康度分析任务
+    """
+    from health.health_analyzer import HealthAnalyzer
+    try:
+        analyzer = HealthAnalyzer(request_data.github_repo, request_data.days, request_data.since, request_data.until)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return submit_job("health",
+                      lambda job: analyzer.analyze_health(progress=job.set_stage),
+                      HealthAnalyzer.STAGES)
+
+# 批量开发者分析：一次扫描数据，多进程分析，结果逐行写入 BATCH_DIR/{job_id}.jsonl
+class BatchAnalyzeRequest(BaseModel):
+    github_users: list[str] | None = None  # 默认为所有有commit或pr的贡献者
+    figures: bool = False  # 为True时保存图表
+    info: bool = False  # 为True时从github获取用户基本信息
+
+@app.post("/jobs/dvpr_skills/batch")
+def submit_batch_job(request_data: BatchAnalyzeRequest) -> dict:
+    """
+    提交批量开发者技能分析任务，完成后任务结果为统计信息，各用户的结果通过 /jobs/{job_id}/results 获取
+    """
+    from skills import batch
+    return submit_job("dvpr_skills_batch",
+                      lambda job: batch.run_batch(Path(BATCH_DIR) / f"{job.id}.jsonl", request_data.github_users,
+                                                  figures=request_data.figures, fetch_info=request_data.info,
+                                                  progress=job.set_stage),
+                      batch.STAGES, batch=True)
+
+@app.get("/jobs/{job_id}/results")
+def batch_results(job_id: str):
+    """
+    批量分析的结果文件（jsonl，每行一个用户），任务进行中时为已完成的部分
+    """
+    path = Path(BATCH_DIR) / f"{job_id}.jsonl"
+    if not job_id.isalnum() or not path.exists():
+        raise HTTPException(status_code=404, detail=f"结果不存在：{job_id}")
+    return FileResponse(path, media_type="application/x-ndjson")
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str) -> dict:
+    """
+    查询任务的状态、当前阶段和进度，完成后包含分析结果
+    """
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"任务不存在：{job_id}")
+    return ORJSONResponse(content=job.to_dict())
+
 
 if __name__ == "__main__":
     import uvicorn
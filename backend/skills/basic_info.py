@@ -1,17 +1,15 @@
-import json
-from pathlib import Path
 import logging
 
-def basic_info(task_name: str) -> dict:
+from utils import metrics
+
+@metrics.timed("skills")
+def basic_info(data: dict) -> dict:
     """
     获取指定用户的基本信息，包括姓名、邮箱、创建时间、仓库等
     """
-    logging.info(f"Analyzing basic info for task: {task_name}")
-    
-    user_cache_dir = Path("cache") / task_name
+    logging.info(f"Analyzing basic info for user: {data['username']}")
 
-    with open(user_cache_dir / "info.json", 'r', encoding='utf-8') as f:
-        info = json.load(f)
+    info = dict(data['info'])
     info['public_repos_cnt'] = info.pop('public_repos')
     for key in ["created_at", "updated_at"]:
         if key in info and info[key]:
@@ -22,6 +20,9 @@ def basic_info(task_name: str) -> dict:
 
 if __name__ == "__main__":
 
+    from utils.load_user_data import load_snapshot
+    from utils.scratch import scratch
+
     logging.basicConfig(
         format="%(asctime)s (PID %(process)d) [%(levelname)s] %(filename)s:%(lineno)d %(message)s",
         level=logging.INFO,
@@ -31,5 +32,5 @@ if __name__ == "__main__":
     username = 'dune0310421'
     # username = 'Aurelius84'
 
-    info = basic_info(username)
+    info = basic_info(load_snapshot(scratch.root / username))
     print(f"User {username} info: {info}")
\ No newline at end of file
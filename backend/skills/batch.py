@@ -0,0 +1,148 @@
+import sys
+import json
+import logging
+import argparse
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+import orjson
+from github import Github
+
+from skills.developer_analyzer import DeveloperAnalyzer
+from utils import load_user_data, dataset, serialize
+from get_data.get_user_info import get_user_info
+from config import GITHUB_TOKEN, BATCH_WORKERS
+
+logger = logging.getLogger(__name__)
+
+STAGES = ('group', 'score')  # 批量分析的各阶段，用于报告进度
+
+def contributors(grouped: dict) -> list[str]:
+    """
+    有commit或pr的用户（只有评论、review的用户不计入）
+    """
+    return sorted(username for username, data in grouped.items() if data['commits'] or data['prs'])
+
+def _resume(output: Path) -> set[str]:
+    """
+    结果文件中已成功分析的用户；末尾写了一半的行（上次中断）被截掉，失败的用户重新分析
+    """
+    done = set()
+    if not output.exists():
+        return done
+    with open(output, 'rb+') as f:
+        content = f.read()
+        end = content.rfind(b'\n') + 1
+        if end < len(content):
+            f.truncate(end)
+    for line in content[:end].splitlines():
+        try:
+            record = orjson.loads(line)
+        except orjson.JSONDecodeError:
+            continue
+        if "error" not in record:
+            done.add(record["username"])
+    return done
+
+def _compact(result: dict) -> dict:
+    """
+    去掉结果中的plotly图和图片（figures=False 时为None），只保留数值和文本
+    """
+    go = sys.modules.get("plotly.graph_objects")
+    compact = {}
+    for key, value in result.items():
+        if isinstance(value, bytes) or (go is not None and isinstance(value, go.Figure)):
+            continue
+        if value is None and key.startswith("fig_"):
+            continue
+        compact[key] = _compact(value) if isinstance(value, dict) else value
+    return compact
+
+def _score(username: str, data: dict, figures: bool, fetch_info: bool) -> tuple[bool, bytes]:
+    """
+    在子进程中分析一个用户，返回 (是否成功, 结果文件中的一行)
+    """
+    try:
+        data['username'] = username
+        data['info'] = get_user_info(Github(GITHUB_TOKEN), username) if fetch_info else None
+        result = DeveloperAnalyzer(username).analyze_data(data, figures)
+        record = {"username": username, "result": result if figures else _compact(result)}
+        ok = True
+    except Exception as e:
+        logger.error(f"Error analyzing {username}: {e}")
+        record = {"username": username, "error": str(e)}
+        ok = False
+    return ok, serialize.dumps(record) + b'\n'
+
+def run_batch(output: str | Path, usernames: list[str] | None = None, workers: int = BATCH_WORKERS,
+              figures: bool = False, fetch_info: bool = False, progress=None) -> dict:
+    """
+    批量分析开发者技能，每个用户一行json追加写入output：{"username", "result"} 或 {"username", "error"}
+    所有仓库的数据只扫描一次并按login分组，每个用户只把自己的数据交给子进程分析
+    usernames 为None时分析所有贡献者；output已存在时跳过其中已成功的用户（中断后可继续）
+    figures=False 时不保存图表；fetch_info=True 时从github获取基本信息（受限流影响）
+    """
+    progress = progress or (lambda stage: None)
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(dataset.DATA_DIR / "paddle_repos.json", 'r', encoding='utf-8') as f:
+        repos = [repo["full_name"] for repo in json.load(f)]
+
+    progress('group')
+    grouped = load_user_data.users_data(repos, usernames)
+    done = _resume(output)
+    todo = [u for u in dict.fromkeys(usernames if usernames is not None else contributors(grouped)) if u not in done]
+    logger.info(f"Analyzing {len(todo)} users ({len(done)} already done) with {workers} workers")
+
+    progress('score')
+    summary = {"output": str(output), "scored": 0, "failed": 0, "skipped": len(done)}
+    with open(output, 'ab') as f:
+        def write(ok, line):
+            f.write(line)
+            f.flush()
+            summary["scored" if ok else "failed"] += 1
+            count = summary["scored"] + summary["failed"]
+            if count % 100 == 0:
+                logger.info(f"Analyzed {count}/{len(todo)} users")
+
+        if workers <= 1:
+            for username in todo:
+                write(*_score(username, grouped.pop(username), figures, fetch_info))
+            return summary
+
+        # spawn：在web服务的线程中fork不安全；限制提交中的任务数，避免所有用户的数据同时在队列中
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            pending = set()
+            for username in todo:
+                if len(pending) >= workers * 2:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        write(*future.result())
+                pending.add(executor.submit(_score, username, grouped.pop(username), figures, fetch_info))
+            for future in wait(pending).done:
+                write(*future.result())
+    return summary
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s (PID %(process)d) [%(levelname)s] %(filename)s:%(lineno)d %(message)s",
+        level=logging.INFO,
+    )
+
+    parser = argparse.ArgumentParser(description="批量分析开发者技能，结果逐行写入jsonl文件，中断后重新运行可继续")
+    parser.add_argument("output", help="结果文件（jsonl）")
+    parser.add_argument("usernames", nargs="*", help="要分析的用户，默认为所有有commit或pr的贡献者")
+    parser.add_argument("--users-file", help="要分析的用户列表文件，每行一个")
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS, help="进程数")
+    parser.add_argument("--figures", action="store_true", help="保存图表（结果文件会大很多）")
+    parser.add_argument("--info", action="store_true", help="从github获取用户基本信息")
+    args = parser.parse_args()
+
+    usernames = list(args.usernames)
+    if args.users_file:
+        with open(args.users_file, 'r', encoding='utf-8') as f:
+            usernames.extend(line.strip() for line in f if line.strip())
+    summary = run_batch(args.output, usernames or None, args.workers, args.figures, args.info)
+    print(summary)
@@ -1,21 +1,32 @@
+import copy
 import json
 import os
 from datetime import datetime, timezone
-from pathlib import Path
 from uuid import uuid4
 import logging
-from pathlib import Path
 from github import Github
 
 from skills import basic_info, experience, hardskill, softskill
-from utils import load_user_data
+from utils import load_user_data, dataset, metrics
+from utils.artifacts import externalize, exists as artifacts_exist
+from utils.result_cache import ResultCache, SingleFlight, Abandoned
+from utils.scratch import scratch
 from get_data.get_user_info import get_user_info
-from config import GITHUB_TOKEN, NOWDATE
+from config import GITHUB_TOKEN, NOWDATE, RESULT_CACHE_DIR, NETWORK_CACHE_TTL, SKILLS_SNAPSHOT
+
+# 分析结果缓存（基本信息来自github，按NETWORK_CACHE_TTL过期），并发的同一用户请求只计算一次
+_results = ResultCache(maxsize=128, ttl=NETWORK_CACHE_TTL, disk_dir=os.path.join(RESULT_CACHE_DIR, "skills") if RESULT_CACHE_DIR else None,
+                       name="skills")
+_inflight = SingleFlight()
+# 图片保存为文件后的结果（图片替换为文件地址）
+_artifact_results = ResultCache(maxsize=128, ttl=NETWORK_CACHE_TTL, name="skills_artifacts")
 
 class DeveloperAnalyzer:
     """
     分析开发者的技能。
     """
+    STAGES = ('fetch', 'experience', 'hardskill', 'softskill')  # 分析的各阶段，用于报告进度
+
     def __init__(self, username: str):
         """
         初始化分析器，设置cache目录。
@@ -24,113 +35,157 @@ class DeveloperAnalyzer:
         self.task_id = str(uuid4())
         # self.task_name = username  # ---暂时不使用uuid，方便调试---
         self.task_name = username + "_" + self.task_id
-        self.user_cache_dir = Path("cache") / self.task_name  # 临时目录：./cache/{github_user}_{uuid4()}/
-
-        self.user_cache_dir.mkdir(parents=True, exist_ok=True)  # 创建目录
+        self.user_cache_dir = scratch.root / self.task_name  # 调试快照目录：SCRATCH_DIR/{github_user}_{uuid4()}/，仅在SKILLS_SNAPSHOT时创建
 
-    def fetch_data(self):
+    @metrics.timed("skills")
+    def fetch_data(self) -> dict:
         """
-        从 GitHub 和本地获取数据，并存入json
+        从 GitHub 和本地获取数据，返回开发者数据：info, commits, pr, issue, review, comment, merge权限
+        设置 SKILLS_SNAPSHOT 时另存为json，便于调试
         """
         gh = Github(GITHUB_TOKEN)
         # ---从github获取用户基本信息和仓库信息---
         info = get_user_info(gh, self.username)
-        with open(self.user_cache_dir / "info.json", 'w', encoding='utf-8') as f:
-            json.dump(info, f, ensure_ascii=False, indent=4)
 
         # ---从本地加载paddle相关repo，获取commits, pr, issue, review, comment等信息---
         with open(f"data/paddle_repos.json", 'r', encoding='utf-8') as f:
             repos = json.load(f)
-        # commit
-        commits = []
-        for repo in repos:
-            cmts = load_user_data.user_commits_in_repo(self.username, repo["full_name"])
-            commits.extend(cmts)
-        with open(self.user_cache_dir / "commits.json", 'w', encoding='utf-8') as f:
-            json.dump(commits, f, ensure_ascii=False, indent=4)
-        # pr
-        prs = []
-        for repo in repos:
-            prs_tmp = load_user_data.user_prs_in_repo(self.username, repo["full_name"])
-            prs.extend(prs_tmp)
-        with open(self.user_cache_dir / "prs.json", 'w', encoding='utf-8') as f:
-            json.dump(prs, f, ensure_ascii=False, indent=4)
-        # issue
-        issues = []
-        for repo in repos:
-            issues_tmp = load_user_data.user_issues_in_repo(self.username, repo["full_name"])
-            issues.extend(issues_tmp)
-        with open(self.user_cache_dir / "issues.json", 'w', encoding='utf-8') as f:
-            json.dump(issues, f, ensure_ascii=False, indent=4)
-        # review
-        review_prs = []
-        for repo in repos:
-            reviews_tmp = load_user_data.user_review_prs_in_repo(self.username, repo["full_name"])
-            review_prs.extend(reviews_tmp)
-        with open(self.user_cache_dir / "review_prs.json", 'w', encoding='utf-8') as f:
-            json.dump(review_prs, f, ensure_ascii=False, indent=4)
-        # comment
-        comment_prs_issues = []
-        for repo in repos:
-            comments_tmp = load_user_data.user_comment_prs_issues_in_repo(self.username, repo["full_name"])
-            comment_prs_issues.extend(comments_tmp)
-        with open(self.user_cache_dir / "comment_prs_issues.json", 'w', encoding='utf-8') as f:
-            json.dump(comment_prs_issues, f, ensure_ascii=False, indent=4)
-        # merge权限
-        merge_repos = []
-        for repo in repos:
-            flag = load_user_data.user_merge_permission_in_repo(self.username, repo["full_name"])
-            if flag:
-                merge_repos.append(repo["full_name"])
-        # print(f"{username} has merge permission in {len(merge_repos)} repositories: {merge_repos}")
-        with open(self.user_cache_dir / "repos_can_merge.json", 'w', encoding='utf-8') as f:
-            json.dump(merge_repos, f, ensure_ascii=False, indent=4)
-
-    
-    def analyze_skills(self) -> dict:
+        # 通过倒排索引只读取该用户自己的记录
+        data = load_user_data.user_data(self.username, [repo["full_name"] for repo in repos])
+        data['username'] = self.username
+        data['info'] = info
+
+        if SKILLS_SNAPSHOT:
+            load_user_data.save_snapshot(data, scratch.create(self.task_name))
+        return data
+
+    def analyze_skills(self, progress=None, artifacts: bool = False) -> dict:
         """
         分析技能，返回技能列表。
+        结果按 (用户名, NOWDATE, 数据集版本) 缓存；progress(stage) 在进入每个阶段时调用
+        artifacts=True 时图片只生成一次并按内容保存为文件，结果中为文件地址
         """
+        key = (self.username, NOWDATE.isoformat(), dataset.dataset_version())
+        if artifacts:
+            refs = _artifact_results.get(key)
+            if refs is None or not artifacts_exist(refs):
+                refs = externalize(self.analyze_skills(progress))
+                _artifact_results.set(key, refs)
+            return copy.deepcopy(refs)
+        result = _results.get(key)
+        if result is None:
+            result = _inflight.do(key, lambda: self._analyze_cached(key, progress))
+        return copy.deepcopy(result)
+
+    def _analyze_cached(self, key, progress=None) -> dict:
+        result = _results.get(key)  # 等待期间可能已由其他请求算好
+        if result is None:
+            result = self._analyze(progress)
+            _results.set(key, result)
+        return result
+
+    def _analyze(self, progress=None) -> dict:
+        return dict(self._sections(progress))
+
+    def _sections(self, progress=None):
+        """
+        依次计算结果的各部分，生成 (部分名, 结果)
+        """
+        progress = progress or (lambda stage: None)
+        yield "username", self.username
         # 读取数据
-        self.fetch_data()  # ---调试时注释掉，避免重复获取---
+        progress('fetch')
+        data = self.fetch_data()  # ---调试时可改为 load_user_data.load_snapshot(self.user_cache_dir)，避免重复获取---
+
+        yield "basic_info", basic_info.basic_info(data)
+        yield from self._data_sections(data, progress)
 
-        basic_info_data = basic_info.basic_info(self.task_name)
-        experience_data, fig_repo_contrib, fig_recent_contrib = experience.experience(self.task_name, NOWDATE)
-        fig_lang, fig_domain_bytes, solving_score, fig_solving = hardskill.hardskill(self.task_name, NOWDATE)
-        fig_consistency, fig_activeness, time_mgmt, comm_score, fig_comm, sample_commits = softskill.softskill(self.task_name)
+    def _data_sections(self, data: dict, progress=None, figures: bool = True):
+        """
+        由开发者数据计算经验、硬技能、软技能，生成 (部分名, 结果)；figures=False 时不绘图（批量分析），图为None
+        """
+        progress = progress or (lambda stage: None)
+        progress('experience')
+        experience_data, fig_repo_contrib, fig_recent_contrib = experience.experience(data, NOWDATE, figures)
+        yield "experience", {
+            "data": experience_data,
+            "fig_repo_contrib": fig_repo_contrib,
+            "fig_recent_contrib": fig_recent_contrib
+        }
+        progress('hardskill')
+        fig_lang, fig_domain_bytes, solving_score, fig_solving = hardskill.hardskill(data, NOWDATE, figures)
+        yield "hardskill", {
+            "fig_lang": fig_lang,
+            "fig_domain_bytes": fig_domain_bytes,
+            "solving_score": solving_score,
+            "fig_solving": fig_solving
+        }
+        progress('softskill')
+        fig_consistency, fig_activeness, time_mgmt, comm_score, fig_comm, sample_commits = softskill.softskill(data, figures)
+        yield "softskill", {
+            "fig_consistency": fig_consistency,
+            "fig_activeness": fig_activeness,
+            "time_mgmt": time_mgmt,
+            "comm_score": comm_score,
+            "fig_comm": fig_comm,
+            "sample_commits": sample_commits
+        }
 
-        # 返回结果
+    def analyze_data(self, data: dict, figures: bool = True) -> dict:
+        """
+        分析已读取的开发者数据（批量分析时使用，见 skills.batch），不读取数据也不使用结果缓存
+        data['info'] 为None（未从github获取基本信息）时 basic_info 为None；figures=False 时不绘图
+        """
         result = {
             "username": self.username,
-            "basic_info": basic_info_data,
-            "experience": {
-                "data": experience_data,
-                "fig_repo_contrib": fig_repo_contrib,
-                "fig_recent_contrib": fig_recent_contrib
-            },
-            "hardskill": {
-                "fig_lang": fig_lang,
-                "fig_domain_bytes": fig_domain_bytes,
-                "solving_score": solving_score,
-                "fig_solving": fig_solving
-            },
-            "softskill": {
-                "fig_consistency": fig_consistency,
-                "fig_activeness": fig_activeness,
-                "time_mgmt": time_mgmt,
-                "comm_score": comm_score,
-                "fig_comm": fig_comm,
-                "sample_commits": sample_commits
-            }
+            "basic_info": basic_info.basic_info(data) if data.get('info') is not None else None,
         }
+        result.update(self._data_sections(data, figures=figures))
         return result
 
-    # def clean_up(self):
-    #     """
-    #     分析完成后删除临时目录。
-    #     """
-    #     import shutil
-    #     shutil.rmtree(self.user_cache_dir)
+    def iter_skills(self, progress=None):
+        """
+        逐部分返回技能分析结果 (部分名, 结果)，每部分算好后立即返回，全部完成后写入结果缓存
+        与 analyze_skills 共用 _inflight：相同用户已有计算进行中时等待其结果，再逐部分返回
+        """
+        key = (self.username, NOWDATE.isoformat(), dataset.dataset_version())
+        while True:
+            result = _results.get(key)
+            if result is not None:
+                yield from copy.deepcopy(result).items()
+                return
+            future, leader = _inflight.begin(key)
+            if leader:
+                break
+            try:
+                result = future.result()
+            except Abandoned:
+                continue
+            yield from copy.deepcopy(result).items()
+            return
+
+        result = {}
+        try:
+            cached = _results.get(key)  # 等待期间可能已由其他请求算好
+            sections = cached.items() if cached is not None else self._sections(progress)
+            for section, value in sections:
+                result[section] = value
+                yield section, copy.deepcopy(value)
+        except GeneratorExit:
+            _inflight.finish(key, future, error=Abandoned()) # 客户端断开，等待的请求自行计算
+            raise
+        except BaseException as e:
+            _inflight.finish(key, future, error=e)
+            raise
+        if cached is None:
+            _results.set(key, result)
+        _inflight.finish(key, future, result)
+
+    def clean_up(self):
+        """
+        删除调试快照目录（未删除的由scratch按大小和时间限制自动清理）。
+        """
+        scratch.release(self.user_cache_dir)
 
 if __name__ == "__main__":
 
@@ -1,10 +1,10 @@
-import json
 import plotly.graph_objects as go
 import pandas as pd
 from datetime import datetime, timezone
-from pathlib import Path
 import logging
 
+from utils import metrics
+
 def plot_repo_contrib(df_repo_contrib: pd.DataFrame) -> go.Figure:
     """
     绘制贡献总数前5个仓库的统计图
@@ -92,26 +92,19 @@ def plot_recent_contrib(df_contrib: pd.DataFrame) -> go.Figure:
     )
     return fig
 
-def experience(task_name: str, nowdate: datetime) -> tuple[dict, go.Figure, go.Figure]:
+@metrics.timed("skills")
+def experience(data: dict, nowdate: datetime, figures: bool = True) -> tuple[dict, go.Figure, go.Figure]:
     """
-    用户的开发经验
+    用户的开发经验；figures=False 时不统计绘图用的数据，两个图为None
     """
-    logging.info(f"Analyzing experience for task: {task_name}")
-    username = task_name.split("_")[0]  # 从task_name中提取username
-    # 读取数据
-    user_cache_dir = Path("cache") / task_name
-    with open(user_cache_dir / "commits.json", 'r', encoding='utf-8') as f:
-        commits = json.load(f)
-    with open(user_cache_dir / "prs.json", 'r', encoding='utf-8') as f:
-        prs = json.load(f)
-    with open(user_cache_dir / "issues.json", 'r', encoding='utf-8') as f:
-        issues = json.load(f)
-    with open(user_cache_dir / "comment_prs_issues.json", 'r', encoding='utf-8') as f:
-        comment_prs_issues = json.load(f)
-    with open(user_cache_dir / "review_prs.json", 'r', encoding='utf-8') as f:
-        review_prs = json.load(f)
-    with open(user_cache_dir / "repos_can_merge.json", 'r', encoding='utf-8') as f:
-        repos_can_merge = json.load(f)
+    username = data['username']
+    logging.info(f"Analyzing experience for user: {username}")
+    commits = data['commits']
+    prs = data['prs']
+    issues = data['issues']
+    comment_prs_issues = data['comment_prs_issues']
+    review_prs = data['review_prs']
+    repos_can_merge = data['repos_can_merge']
 
     # ---统计贡献总数---
     df_contrib = pd.DataFrame(columns=['commits', 'prs', 'issues', 'comments', 'reviews'], dtype=int)
@@ -154,6 +147,8 @@ def experience(task_name: str, nowdate: datetime) -> tuple[dict, go.Figure, go.F
         'comments_cnt': int(df_contrib['comments'].sum()),
         'reviews_cnt': int(df_contrib['reviews'].sum()),
     }
+    if not figures:
+        return total_experience, None, None
 
     # ---按贡献总数排序，获取前5个repo；如果少于5个repo，补齐---
     df_contrib["total"] = df_contrib[['commits', 'prs', 'issues', 'comments', 'reviews']].sum(axis=1)
@@ -203,6 +198,9 @@ def experience(task_name: str, nowdate: datetime) -> tuple[dict, go.Figure, go.F
 
 if __name__ == "__main__":
 
+    from utils.load_user_data import load_snapshot
+    from utils.scratch import scratch
+
     logging.basicConfig(
         format="%(asctime)s (PID %(process)d) [%(levelname)s] %(filename)s:%(lineno)d %(message)s",
         level=logging.INFO,
@@ -214,11 +212,11 @@ if __name__ == "__main__":
     # 计时
     start_time = datetime.now()
 
-    experience_data, fig_repo_contrib, fig_recent_contrib = experience(username, datetime(2025, 6, 30, tzinfo=timezone.utc))
+    experience_data, fig_repo_contrib, fig_recent_contrib = experience(load_snapshot(scratch.root / username), datetime(2025, 6, 30, tzinfo=timezone.utc))
     print(f"experience of developer {username}: {experience_data}")
     # 保存绘图
-    fig_repo_contrib.write_html(Path("cache") / username / "repo_contrib.html")
-    fig_recent_contrib.write_html(Path("cache") / username / "recent_contrib.html")
+    fig_repo_contrib.write_html(scratch.root / username / "repo_contrib.html")
+    fig_recent_contrib.write_html(scratch.root / username / "recent_contrib.html")
 
     end_time = datetime.now()
     print(f"Time taken: {end_time - start_time}")
@@ -3,7 +3,6 @@ import json
 import math
 import logging
 from datetime import datetime
-from pathlib import Path
 import matplotlib.pyplot as plt
 import plotly.graph_objects as go
 from wordcloud import WordCloud
@@ -11,6 +10,7 @@ from io import BytesIO
 
 from utils.extension_to_language import extension_to_language
 from utils.repo_util import project_weights, module_weights
+from utils import metrics
 
 def plot_lang_skills(lang_counts: dict) -> go.Figure:
     """
@@ -97,13 +97,13 @@ def plot_pr_types(pr_type_origin: dict, pr_type_weights: dict) -> go.Figure:
                     dict(label="PR Count",
                          method="update",
                          args=[{"visible": [True, False]},
-                               {"title": f"PR Count by Type",
+                               {"title": "PR Count by Type",
                                 "yaxis": {"title": "Count"}}]),
 
                     dict(label="PR Score",
                          method="update",
                          args=[{"visible": [False, True]},
-                               {"title": f"PR Score by Type",
+                               {"title": "PR Score by Type",
                                 "yaxis": {"title": "Weight"}}])
                 ]
             )
@@ -116,7 +116,8 @@ def plot_pr_types(pr_type_origin: dict, pr_type_weights: dict) -> go.Figure:
     return fig
 
 # 编程语言使用能力
-def language_skill(task_name: str, nowdate: datetime) -> go.Figure:
+@metrics.timed("skills")
+def language_skill(commits: list[dict], nowdate: datetime) -> go.Figure:
     """
     统计用户的编程语言使用情况
     """
@@ -125,9 +126,6 @@ def language_skill(task_name: str, nowdate: datetime) -> go.Figure:
     ext_to_lang = extension_to_language()
 
     # 获取commit修改文件的编程语言
-    user_cache_dir = Path("cache") / task_name
-    with open(user_cache_dir / "commits.json", 'r', encoding='utf-8') as f:
-        commits = json.load(f)
     lang_counts = {}
     for commit in commits:
         files = commit['files']
@@ -153,7 +151,8 @@ def language_skill(task_name: str, nowdate: datetime) -> go.Figure:
     return fig
 
 # 领域能力
-def domain_skill(task_name: str) -> bytes:
+@metrics.timed("skills")
+def domain_skill(commits: list[dict]) -> bytes:
     """
     统计用户的领域能力
     """
@@ -165,9 +164,6 @@ def domain_skill(task_name: str) -> bytes:
         paddle_domains[repo['full_name']] = repo.get('topics', []) + repo.get('domain', '').split(', ')
         
     # 提取用户贡献过commit的repo
-    user_cache_dir = Path("cache") / task_name
-    with open(user_cache_dir / "commits.json", 'r', encoding='utf-8') as f:
-        commits = json.load(f)
     repos = []
     for commit in commits:
         if commit['repo'] not in repos:
@@ -191,9 +187,10 @@ def domain_skill(task_name: str) -> bytes:
     return buf
 
 # 问题解决能力
-def problem_solving_skill(task_name: str) -> tuple[float, go.Figure]:
+@metrics.timed("skills")
+def problem_solving_skill(prs: list[dict], figures: bool = True) -> tuple[float, go.Figure]:
     """
-    用户的问题解决能力，考虑 1）项目难度 2）贡献重要度 3）贡献类型
+    用户的问题解决能力，考虑 1）项目难度 2）贡献重要度 3）贡献类型；figures=False 时图为None
     """
 
     # 获取项目难度
@@ -202,9 +199,6 @@ def problem_solving_skill(task_name: str) -> tuple[float, go.Figure]:
     m_w_dic = module_weights()
 
     # print("Calculating pr weights...")
-    user_cache_dir = Path("cache") / task_name
-    with open(user_cache_dir / "prs.json", 'r', encoding='utf-8') as f:
-        prs = json.load(f)
     prs = [pr for pr in prs if pr['merged'] == True]  # 只考虑已合并的PR
     pr_weights = {}
     for pr in prs:
@@ -249,28 +243,35 @@ def problem_solving_skill(task_name: str) -> tuple[float, go.Figure]:
 
     # 最终问题解决能力分数和绘图
     total_score = sum(pr_type_weights.values())
-    fig = plot_pr_types(pr_type_origin, pr_type_weights)
+    fig = plot_pr_types(pr_type_origin, pr_type_weights) if figures else None
 
     return total_score, fig
 
-def hardskill(task_name: str, nowdate: datetime) -> tuple[go.Figure, bytes, float, go.Figure]:
+def hardskill(data: dict, nowdate: datetime, figures: bool = True) -> tuple[go.Figure, bytes, float, go.Figure]:
     """
-    用户的硬技能分析
+    用户的硬技能分析；figures=False 时只计算分数，不统计绘图用的数据，图和词云为None
     """
-    logging.info(f"Analyzing hardskills for task: {task_name}")
+    logging.info(f"Analyzing hardskills for user: {data['username']}")
+    if not figures:
+        solving_score, _ = problem_solving_skill(data['prs'], figures=False)
+        return None, None, solving_score, None
+
     # 1.编程语言使用能力
-    fig_lang_skill = language_skill(task_name, nowdate)
+    fig_lang_skill = language_skill(data['commits'], nowdate)
 
     # 2.领域能力
-    fig_domain_skill_bytes = domain_skill(task_name)
+    fig_domain_skill_bytes = domain_skill(data['commits'])
 
     # 3.问题解决能力
-    solving_score, fig_solving_skill = problem_solving_skill(task_name)
+    solving_score, fig_solving_skill = problem_solving_skill(data['prs'])
 
     return fig_lang_skill, fig_domain_skill_bytes, solving_score, fig_solving_skill
 
 if __name__ == "__main__":
 
+    from utils.load_user_data import load_snapshot
+    from utils.scratch import scratch
+
     logging.basicConfig(
         format="%(asctime)s (PID %(process)d) [%(levelname)s] %(filename)s:%(lineno)d %(message)s",
         level=logging.WARNING,
@@ -283,11 +284,11 @@ if __name__ == "__main__":
     # username = 'dune0310421'
     username = 'Aurelius84'
 
-    fig1, fig2_bytes, solving_score, fig3 = hardskill(username, datetime(2025, 6, 30, tzinfo=None))
-    fig1.write_html(Path("cache") / username / "lang_skill.html")
-    with open(Path("cache") / username / "domain_skills.png", 'wb') as f:
+    fig1, fig2_bytes, solving_score, fig3 = hardskill(load_snapshot(scratch.root / username), datetime(2025, 6, 30, tzinfo=None))
+    fig1.write_html(scratch.root / username / "lang_skill.html")
+    with open(scratch.root / username / "domain_skills.png", 'wb') as f:
         f.write(fig2_bytes)
-    fig3.write_html(Path("cache") / username / "solving_skill.html")
+    fig3.write_html(scratch.root / username / "solving_skill.html")
     print(f"Problem Solving Skill Score: {solving_score}")
 
     end_time = datetime.now()
@@ -1,14 +1,9 @@
-import os
-import json
-import math
 import logging
-import joblib
-import pandas as pd
-import numpy as np
 from datetime import datetime
-from pathlib import Path
 import plotly.graph_objects as go
 
+from utils import metrics
+
 def plot_consistency(repo_consistency: dict) -> go.Figure:
     """
     绘制责任心柱状图
@@ -107,14 +102,12 @@ def plot_communication(labels: list[int]) -> go.Figure:
     return fig
 
 # 责任心
-def commitment(task_name: str) -> tuple[go.Figure, go.Figure]:
+@metrics.timed("skills")
+def commitment(commits: list[dict]) -> tuple[go.Figure, go.Figure]:
     """
     责任心：用户在每个项目中的最大连续贡献月份数 + 一段时间内的贡献月份比例。
     """
 
-    user_cache_dir = Path("cache") / task_name
-    with open(user_cache_dir / "commits.json", 'r', encoding='utf-8') as f:
-        commits = json.load(f)
         
     # 获取每个项目的贡献年月
     project_months = {}
@@ -193,13 +186,11 @@ def commitment(task_name: str) -> tuple[go.Figure, go.Figure]:
     return fig_consistency,fig_activeness
 
 # 时间管理能力
-def time_management(task_name: str) -> dict:
+@metrics.timed("skills")
+def time_management(commits: list[dict]) -> dict:
     """
     时间管理：一段时间窗口内同时活跃于最多项目
     """
-    user_cache_dir = Path("cache") / task_name
-    with open(user_cache_dir / "commits.json", 'r', encoding='utf-8') as f:
-        commits = json.load(f)
 
     # 获取每个月的活跃项目
     month_projects = {}
@@ -263,16 +254,14 @@ def time_management(task_name: str) -> dict:
     }
 
 # 沟通能力
-def communication_skill(task_name: str) -> tuple[float, go.Figure, dict]:
+@metrics.timed("skills")
+def communication_skill(commits: list[dict], figures: bool = True) -> tuple[float, go.Figure, dict]:
     """
-    沟通能力：commit message的质量
+    沟通能力：commit message的质量；figures=False 时图为None
     """
-    user_cache_dir = Path("cache") / task_name
-    with open(user_cache_dir / "commits.json", 'r', encoding='utf-8') as f:
-        commits = json.load(f)
 
     if not commits:
-        return 0.0, plot_communication([]), {}
+        return 0.0, plot_communication([]) if figures else None, {}
 
     commit_labels = [commit['why_what_label'] for commit in commits]
 
@@ -287,7 +276,7 @@ def communication_skill(task_name: str) -> tuple[float, go.Figure, dict]:
     score = round(score * 100, 2)  # 转化为百分制，保留两位小数
 
     # 绘制饼图
-    fig_comm = plot_communication(commit_labels)
+    fig_comm = plot_communication(commit_labels) if figures else None
 
     # 抽取每类的示例 commit
     label_names = {
@@ -316,23 +305,27 @@ def communication_skill(task_name: str) -> tuple[float, go.Figure, dict]:
     return score, fig_comm, sample_commits
 
 
-def softskill(task_name: str) -> tuple[go.Figure, go.Figure, dict, float, go.Figure, dict]:
+def softskill(data: dict, figures: bool = True) -> tuple[go.Figure, go.Figure, dict, float, go.Figure, dict]:
     """
-    软技能：责任心、时间管理能力、沟通能力
+    软技能：责任心、时间管理能力、沟通能力；figures=False 时不绘图，责任心（只有图）不计算，各图为None
     """
-    logging.info(f"Analyzing softskills for task: {task_name}")
+    logging.info(f"Analyzing softskills for user: {data['username']}")
+    commits = data['commits']
     # 1.责任心
-    fig_consistency, fig_activeness = commitment(task_name)
+    fig_consistency, fig_activeness = commitment(commits) if figures else (None, None)
 
     # 2.时间管理能力
-    time_mgmt = time_management(task_name)
+    time_mgmt = time_management(commits)
 
     # 3.沟通能力
-    comm_score, fig_comm, sample_commits = communication_skill(task_name)
+    comm_score, fig_comm, sample_commits = communication_skill(commits, figures)
 
     return fig_consistency, fig_activeness, time_mgmt, comm_score, fig_comm, sample_commits
 
 if __name__ == "__main__":
+    from utils.load_user_data import load_snapshot
+    from utils.scratch import scratch
+
     logging.basicConfig(
         format="%(asctime)s (PID %(process)d) [%(levelname)s] %(filename)s:%(lineno)d %(message)s",
         level=logging.INFO,
@@ -345,12 +338,12 @@ if __name__ == "__main__":
     # username = 'dune0310421'
     username = 'Aurelius84'
 
-    fig1, fig2, time_mgmt, comm_score, fig_comm, sample_commits = softskill(username)
-    fig1.write_html(Path("cache") / username / "consistency.html")
-    fig2.write_html(Path("cache") / username / "activeness.html")
+    fig1, fig2, time_mgmt, comm_score, fig_comm, sample_commits = softskill(load_snapshot(scratch.root / username))
+    fig1.write_html(scratch.root / username / "consistency.html")
+    fig2.write_html(scratch.root / username / "activeness.html")
     print(f"Time Management: {time_mgmt['max_active_month_start']} - {time_mgmt['max_active_month_end']}, Active Projects: {len(time_mgmt['active_projects'])}, Commit Count: {time_mgmt['commit_count']}")
     print(f"Communication Skill Score: {comm_score}")
-    fig_comm.write_html(Path("cache") / username / "communication.html")
+    fig_comm.write_html(scratch.root / username / "communication.html")
 
     end_time = datetime.now()
     print(f"Time taken: {end_time - start_time}")
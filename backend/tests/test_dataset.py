@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from utils import dataset
+
+REPO = "PaddlePaddle/Paddle"
+
+RECORDS = {
+    'commits': [
+        {
+            'repo': REPO, 'sha': 'a1', 'created_at': '2024-01-01T00:00:00+00:00', 'author': 'alice',
+            'committer': 'web-flow', 'message': '修复 bug ', 'why_what_label': 1,
+            'files': [
+                {'filename': 'a.py', 'status': 'modified', 'additions': 3, 'deletions': 1, 'changes': 4},
+                {'filename': 'b.py', 'status': 'added', 'patch': '@@ -0,0 +1 @@'},  # 缺少增删行数，多出patch
+                {'filename': 'c.py', 'status': 'removed', 'additions': None, 'deletions': 2, 'changes': 2},
+            ],
+        },
+        {'repo': REPO, 'sha': 'a2', 'created_at': '2024-01-02T00:00:00+00:00', 'author': None,
+         'committer': 'bob', 'message': '', 'files': [], 'verified': True},
+        {'repo': REPO, 'sha': 'a3', 'error': 'not found'},
+    ],
+    'prs': [
+        {
+            'repo': REPO, 'number': 1, 'title': 'PR', 'body': None, 'state': 'closed', 'merged': True,
+            'user': 'alice', 'merged_by': 'bob', 'created_at': '2024-01-01T00:00:00+00:00',
+            'comment_by': [['bob', '2024-01-02T00:00:00+00:00']], 'review_by': [],
+            'files': [{'filename': 'a.py', 'additions': 1, 'blob_url': 'https://example.com/a.py'}],
+            'labels': ['bug'],
+        },
+        {'repo': REPO, 'number': 2, 'user': 'bob', 'comment_by': None},
+    ],
+    'issues': [
+        {'repo': REPO, 'number': 3, 'user': 'carol', 'comment_by': [['alice', '2024-01-03T00:00:00+00:00']],
+         'labels': [], 'closed_by': None},
+        {'repo': REPO, 'number': 4, 'error': 'deleted'},
+    ],
+}
+
+@pytest.fixture(params=['parquet', 'arrow'])
+def converted(request, tmp_path, monkeypatch):
+    monkeypatch.setattr(dataset, 'DATA_DIR', tmp_path)
+    monkeypatch.setattr(dataset, 'PARQUET_DIR', tmp_path / "paddle_parquet")
+    monkeypatch.setattr(dataset, 'SNAPSHOT_DIR', tmp_path / "paddle_arrow")
+    for kind, records in RECORDS.items():
+        path = dataset.json_path(REPO, kind)
+        path.parent.mkdir(parents=True)
+        path.write_text(json.dumps(records, ensure_ascii=False), encoding='utf-8')
+    dataset.convert_repo(REPO, request.param)
+    return request.param
+
+@pytest.mark.parametrize('kind', dataset.KINDS)
+def test_records_roundtrip(converted, kind):
+    assert dataset._source(REPO, kind) == converted
+    assert dataset.load_records(REPO, kind) == RECORDS[kind]
+
+def test_columns_roundtrip(converted):
+    columns = dataset.load_columns(REPO, 'commits', ['sha', 'files'])
+    assert columns['files'] == [r.get('files') for r in RECORDS['commits']]
+
+def test_user_records_roundtrip(converted):
+    records = dataset.load_user_records(REPO, 'prs', 'bob', ['user', 'merged_by'], ['comment_by'])
+    assert records == RECORDS['prs']
@@ -0,0 +1,71 @@
+import os
+import re
+import sys
+import hashlib
+from pathlib import Path
+
+from config import ARTIFACT_DIR, ARTIFACT_MAX_BYTES, ARTIFACT_MAX_AGE
+from utils import serialize
+from utils.scratch import ScratchSpace
+
+# 按内容寻址的图片文件：文件名为内容的sha256，内容不变则地址不变，可长期缓存
+NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.(json|png)$")
+MEDIA_TYPES = {"json": "application/json", "png": "image/png"}
+
+# 与临时目录相同的清理策略，被清理的文件在下次引用时重新写入
+space = ScratchSpace(ARTIFACT_DIR, ARTIFACT_MAX_BYTES, ARTIFACT_MAX_AGE)
+
+def path(name: str) -> Path | None:
+    """
+    文件名对应的路径，文件名不合法时返回None
+    """
+    if not NAME_PATTERN.match(name):
+        return None
+    return space.root / name
+
+def put(content: bytes, ext: str) -> str:
+    """
+    保存内容，返回文件名；已存在时只更新修改时间
+    """
+    name = f"{hashlib.sha256(content).hexdigest()}.{ext}"
+    file = space.root / name
+    try:
+        os.utime(file)
+        return name
+    except FileNotFoundError:
+        pass
+    space.root.mkdir(parents=True, exist_ok=True)
+    tmp = file.with_name(f"{name}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as f:
+        f.write(content)
+    os.replace(tmp, file)
+    return name
+
+def exists(refs) -> bool:
+    """
+    结果中引用的文件是否都还在（未被清理）
+    """
+    if isinstance(refs, dict):
+        if "artifact" in refs:
+            return (space.root / refs["artifact"]).exists()
+        return all(exists(v) for v in refs.values())
+    if isinstance(refs, list):
+        return all(exists(v) for v in refs)
+    return True
+
+def externalize(obj):
+    """
+    将结果中的plotly图（json）和图片（png bytes）保存为文件，替换为 {"artifact": 文件名, "url": 地址}
+    """
+    go = sys.modules.get("plotly.graph_objects")  # 结果中有plotly图时必然已导入
+    if go is not None and isinstance(obj, go.Figure):
+        name = put(serialize.dumps(obj), "json")
+    elif isinstance(obj, bytes):
+        name = put(obj, "png")
+    elif isinstance(obj, dict):
+        return {k: externalize(v) for k, v in obj.items()}
+    elif isinstance(obj, (list, tuple)):
+        return [externalize(v) for v in obj]
+    else:
+        return obj
+    return {"artifact": name, "url": f"/artifacts/{name}"}
@@ -1,8 +1,6 @@
 import re
 import warnings
 import numpy as np
-import torch
-import transformers as ppb
 warnings.filterwarnings('ignore')
 
 def split(path):  # splitting by seperators, i.e. non-alnum
@@ -328,6 +326,9 @@ def process_commit_messages(commit_messages,commit_files):
     return commit_messages
 
 def BertEmbedding(labeledDF):
+    # torch和transformers较大，只在需要时导入
+    import torch
+    import transformers as ppb
     # 加载bert模型
     model_class, tokenizer_class, pretrained_weights = (ppb.BertModel, ppb.BertTokenizer, 'bert-base-uncased')
     # Load pretrained model/tokenizer
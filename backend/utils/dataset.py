@@ -0,0 +1,366 @@
+import json
+import os
+import hashlib
+import logging
+import argparse
+import threading
+from pathlib import Path
+
+# pyarrow按需导入：只有存在parquet/arrow数据时才需要
+pa = None
+pq = None
+pc = None
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = Path("data")
+PARQUET_DIR = DATA_DIR / "paddle_parquet"
+SNAPSHOT_DIR = DATA_DIR / "paddle_arrow"  # 只读的Arrow IPC快照，各worker进程内存映射共享
+KINDS = ('commits', 'prs', 'issues')
+
+_mapped_tables = {}  # path -> (mtime, table)，进程内已映射的快照
+_mapped_lock = threading.Lock()
+
+# 每类记录的字段及其Arrow类型；不在其中的字段以json字符串存入 _extra
+FIELDS = {
+    'commits': {
+        'repo': 'string', 'sha': 'string', 'created_at': 'string', 'author': 'string',
+        'committer': 'string', 'message': 'string', 'files': 'files', 'why_what_label': 'int',
+        'error': 'string',
+    },
+    'prs': {
+        'repo': 'string', 'number': 'int', 'title': 'string', 'body': 'string',
+        'issue_number': 'string', 'state': 'string', 'merged': 'bool', 'user': 'string',
+        'merged_by': 'string', 'created_at': 'string', 'closed_at': 'string',
+        'additions': 'int', 'deletions': 'int', 'changed_files': 'int',
+        'commits': 'strings', 'comment_by': 'pairs', 'review_by': 'pairs', 'files': 'files',
+        'type': 'string', 'error': 'string',
+    },
+    'issues': {
+        'repo': 'string', 'number': 'int', 'issue_number': 'int', 'title': 'string',
+        'body': 'string', 'state': 'string', 'user': 'string', 'closed_by': 'string',
+        'created_at': 'string', 'updated_at': 'string', 'closed_at': 'string',
+        'comment_by': 'pairs', 'comments_count': 'strings', 'labels': 'strings',
+        'error': 'string',
+    },
+}
+
+# files 列中每个文件的字段；同样以 _nulls、_extra 保存显式为null的字段和未知字段
+FILE_FIELDS = ('filename', 'status', 'additions', 'deletions', 'changes')
+
+def _schema(kind: str):
+    """
+    构造Arrow表结构，额外两列：_nulls 记录原json中显式为null的字段，_extra 保存未知字段
+    """
+    file_type = pa.struct([
+        ('filename', pa.string()), ('status', pa.string()),
+        ('additions', pa.int64()), ('deletions', pa.int64()), ('changes', pa.int64()),
+        ('_nulls', pa.list_(pa.string())), ('_extra', pa.string()),
+    ])
+    types = {
+        'string': pa.string(),
+        'int': pa.int64(),
+        'bool': pa.bool_(),
+        'strings': pa.list_(pa.string()),
+        'pairs': pa.list_(pa.list_(pa.string())),  # [(login, created_at), ...]
+        'files': pa.list_(file_type),
+    }
+    fields = [(name, types[t]) for name, t in FIELDS[kind].items()]
+    fields += [('_nulls', pa.list_(pa.string())), ('_extra', pa.string())]
+    return pa.schema(fields)
+
+def json_path(repo_full_name: str, kind: str) -> Path:
+    repo_owner, repo_name = repo_full_name.split('/')
+    return DATA_DIR / f"paddle_{kind}" / f"{repo_owner}_{repo_name}_{kind}.json"
+
+def parquet_path(repo_full_name: str, kind: str) -> Path:
+    repo_owner, repo_name = repo_full_name.split('/')
+    return PARQUET_DIR / kind / f"{repo_owner}_{repo_name}.parquet"
+
+def snapshot_path(repo_full_name: str, kind: str) -> Path:
+    repo_owner, repo_name = repo_full_name.split('/')
+    return SNAPSHOT_DIR / kind / f"{repo_owner}_{repo_name}.arrow"
+
+def dataset_version() -> str:
+    """
+    数据集版本：所有json数据文件的修改时间和大小的摘要，数据有更新时随之变化
+    """
+    return paths_version([DATA_DIR / "paddle_repos.json"] + [DATA_DIR / f"paddle_{kind}" for kind in KINDS])
+
+def paths_version(paths: list[Path]) -> str:
+    """
+    一组文件（目录则为其中的文件）的修改时间和大小的摘要
+    """
+    h = hashlib.sha1()
+    for path in paths:
+        try:
+            entries = sorted(os.scandir(path), key=lambda e: e.name) if path.is_dir() else [path]
+        except OSError:
+            continue
+        for entry in entries:
+            try:
+                st = entry.stat() if isinstance(entry, os.DirEntry) else os.stat(entry)
+            except OSError:
+                continue
+            h.update(f"{entry.name}:{st.st_mtime_ns}:{st.st_size};".encode('utf-8'))
+    return h.hexdigest()[:16]
+
+def _pyarrow() -> bool:
+    """
+    导入pyarrow，未安装时返回False（只使用json数据）
+    """
+    global pa, pq, pc
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+            import pyarrow.compute
+        except ImportError:
+            return False
+        pa, pq, pc = pyarrow, pyarrow.parquet, pyarrow.compute
+    return True
+
+def _source(repo_full_name: str, kind: str) -> str:
+    """
+    选择数据来源：不旧于json文件的arrow快照 > parquet > json
+    """
+    try:
+        json_mtime = os.stat(json_path(repo_full_name, kind)).st_mtime
+    except OSError:
+        json_mtime = 0
+    for source, path in (('arrow', snapshot_path(repo_full_name, kind)), ('parquet', parquet_path(repo_full_name, kind))):
+        try:
+            if os.stat(path).st_mtime >= json_mtime:
+                return source if _pyarrow() else 'json'
+        except OSError:
+            continue
+    return 'json'
+
+def _mapped_table(repo_full_name: str, kind: str):
+    """
+    内存映射arrow快照，表中的数据直接引用映射的页面（零拷贝），同一主机的各进程共享页缓存
+    """
+    path = snapshot_path(repo_full_name, kind)
+    mtime = os.stat(path).st_mtime
+    with _mapped_lock:
+        cached = _mapped_tables.get(path)
+        if cached and cached[0] == mtime:
+            return cached[1]
+        source = pa.memory_map(str(path), 'r') # 不关闭，表中的缓冲区引用映射的内存
+        table = pa.ipc.open_file(source).read_all()
+        _mapped_tables[path] = (mtime, table)
+        return table
+
+def preload(repos: list[str]):
+    """
+    预先映射所有arrow快照，新worker的首个请求无需再打开文件
+    """
+    for repo_full_name in repos:
+        for kind in KINDS:
+            if _source(repo_full_name, kind) == 'arrow':
+                _mapped_table(repo_full_name, kind)
+
+def _pack(record: dict, fields) -> dict:
+    """
+    拆分为已知字段和 _nulls/_extra，以便按固定结构存储
+    """
+    row = {k: v for k, v in record.items() if k in fields}
+    row['_nulls'] = [k for k, v in row.items() if v is None]
+    extra = {k: v for k, v in record.items() if k not in fields}
+    row['_extra'] = json.dumps(extra, ensure_ascii=False) if extra else None
+    return row
+
+def _unpack(row: dict, columns: list[str] | None = None) -> dict:
+    """
+    _pack 的逆过程，还原为json中的记录：去掉原json中不存在的字段，合并 _extra
+    """
+    nulls = row.pop('_nulls', None) or []
+    extra = row.pop('_extra', None)
+    record = {k: v for k, v in row.items() if v is not None or k in nulls}
+    if extra:
+        extra = json.loads(extra)
+        if columns is not None:
+            extra = {k: v for k, v in extra.items() if k in columns}
+        record.update(extra)
+    return record
+
+def _unpack_files(files):
+    if not files:
+        return files
+    return [_unpack(f) if f is not None else None for f in files]
+
+def convert_repo(repo_full_name: str, fmt: str = 'parquet'):
+    """
+    将一个仓库的json数据转换为parquet，或不压缩的arrow快照（fmt='arrow'，用于内存映射）
+    """
+    if not _pyarrow():
+        raise ImportError("pyarrow is required to convert the dataset: pip install pyarrow")
+    for kind in KINDS:
+        with open(json_path(repo_full_name, kind), 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        fields = FIELDS[kind]
+        rows = []
+        for record in records:
+            row = _pack(record, fields)
+            if isinstance(row.get('files'), list):
+                row['files'] = [_pack(f, FILE_FIELDS) if isinstance(f, dict) else f for f in row['files']]
+            rows.append(row)
+        table = pa.Table.from_pylist(rows, schema=_schema(kind))
+        path = snapshot_path(repo_full_name, kind) if fmt == 'arrow' else parquet_path(repo_full_name, kind)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        if fmt == 'arrow':
+            with pa.OSFile(str(tmp), 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        else:
+            pq.write_table(table, tmp, compression='zstd')
+        os.replace(tmp, path) # 替换而非覆盖写，已映射旧文件的进程不受影响
+
+def _match(record: dict, filters: list) -> bool:
+    """
+    json回退路径下的过滤，语义与pyarrow的filters一致：[(column, op, value), ...] 为与关系
+    """
+    for column, op, value in filters:
+        v = record.get(column)
+        if v is None:
+            return False
+        if op in ('=', '=='):
+            ok = v == value
+        elif op == '!=':
+            ok = v != value
+        elif op == '<':
+            ok = v < value
+        elif op == '<=':
+            ok = v <= value
+        elif op == '>':
+            ok = v > value
+        elif op == '>=':
+            ok = v >= value
+        elif op == 'in':
+            ok = v in value
+        elif op == 'not in':
+            ok = v not in value
+        else:
+            raise ValueError(f"Unsupported filter op: {op}")
+        if not ok:
+            return False
+    return True
+
+def _read_table(repo_full_name: str, kind: str, source: str, columns: list[str] | None, filters: list | None):
+    if columns is not None:
+        columns = [c for c in columns if c in FIELDS[kind]] + ['_nulls', '_extra']
+    if source == 'parquet':
+        return pq.read_table(parquet_path(repo_full_name, kind), columns=columns, filters=filters or None)
+    table = _mapped_table(repo_full_name, kind)
+    if filters:
+        table = table.filter(pq.filters_to_expression(filters))
+    if columns is not None:
+        table = table.select(columns)
+    return table
+
+def _to_records(table, columns: list[str] | None) -> list[dict]:
+    """
+    将Arrow表的行还原为json中的记录；会为每行创建Python对象，只用于过滤后的少量行或离线的全量扫描
+    """
+    records = []
+    for row in table.to_pylist():
+        record = _unpack(row, columns)
+        if 'files' in record:
+            record['files'] = _unpack_files(record['files'])
+        records.append(record)
+    return records
+
+def load_records(repo_full_name: str, kind: str, columns: list[str] | None = None, filters: list | None = None) -> list[dict]:
+    """
+    读取一个仓库的 commits/prs/issues 记录，与json中的记录一致
+    columns: 只读取这些字段（列裁剪）；filters: [(column, op, value), ...]，parquet下下推到文件读取
+    不加过滤时会把整个表转为Python对象，只用于全量扫描（建立索引、批量分析）；按用户查询用 load_user_records
+    """
+    source = _source(repo_full_name, kind)
+    if source == 'json':
+        with open(json_path(repo_full_name, kind), 'r', encoding='utf-8') as f:
+            records = json.load(f)
+        if filters:
+            records = [r for r in records if _match(r, filters)]
+        if columns is not None:
+            records = [{c: r[c] for c in columns if c in r} for r in records]
+        return records
+    return _to_records(_read_table(repo_full_name, kind, source, columns, filters), columns)
+
+def _involves(record: dict, login: str, columns, pair_columns) -> bool:
+    return (any(record.get(c) == login for c in columns)
+            or any(pair[0] == login for c in pair_columns for pair in record.get(c) or []))
+
+def _pair_rows(column, login: str) -> list[int]:
+    """
+    [(login, 时间), ...] 列中含有login的行号
+    """
+    rows = []
+    start = 0
+    for chunk in column.chunks:
+        pairs = pc.list_flatten(chunk)
+        hit = pc.fill_null(pc.equal(pc.list_element(pairs, 0), login), False)
+        rows.extend(start + i for i in pc.filter(pc.list_parent_indices(chunk), hit).to_pylist())
+        start += len(chunk)
+    return rows
+
+def load_user_records(repo_full_name: str, kind: str, login: str, columns=(), pair_columns=()) -> list[dict]:
+    """
+    读取login参与的记录（顺序与json中相同）：columns 中任一字段等于login，或 pair_columns（[(login, 时间), ...]）中有login
+    arrow/parquet下在列上用Arrow compute找出命中的行，只把这些行转为Python对象，内存映射的快照不会被整体复制
+    """
+    unknown = [c for c in (*columns, *pair_columns) if c not in FIELDS[kind]]
+    if unknown:
+        raise ValueError(f"Not a {kind} column: {unknown}")
+    source = _source(repo_full_name, kind)
+    if source == 'json':
+        with open(json_path(repo_full_name, kind), 'r', encoding='utf-8') as f:
+            return [r for r in json.load(f) if _involves(r, login, columns, pair_columns)]
+
+    table = _read_table(repo_full_name, kind, source, None, None)
+    rows = set()
+    for c in columns:
+        rows.update(pc.indices_nonzero(pc.fill_null(pc.equal(table[c], login), False)).to_pylist())
+    for c in pair_columns:
+        rows.update(_pair_rows(table[c], login))
+    if not rows:
+        return []
+    return _to_records(table.take(sorted(rows)), None)
+
+def load_columns(repo_full_name: str, kind: str, columns: list[str], filters: list | None = None) -> dict[str, list]:
+    """
+    按列读取一个仓库的记录：{column: [value, ...]}，原json中不存在的字段为None
+    """
+    source = _source(repo_full_name, kind)
+    if source == 'json' or any(c not in FIELDS[kind] for c in columns):
+        records = load_records(repo_full_name, kind, columns, filters)
+        return {c: [r.get(c) for r in records] for c in columns}
+    table = _read_table(repo_full_name, kind, source, columns, filters)
+    data = table.select(columns).to_pydict()
+    if 'files' in data:
+        data['files'] = [_unpack_files(files) for files in data['files']]
+    return data
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s (PID %(process)d) [%(levelname)s] %(filename)s:%(lineno)d %(message)s",
+        level=logging.INFO,
+    )
+
+    parser = argparse.ArgumentParser(description="转换飞桨数据集的存储格式")
+    parser.add_argument("--format", choices=['parquet', 'arrow'], default='parquet',
+                        help="parquet: 压缩的列式文件；arrow: 供多个worker内存映射共享的快照")
+    args = parser.parse_args()
+
+    if not _pyarrow():
+        raise SystemExit("pyarrow is required to convert the dataset: pip install pyarrow")
+
+    with open(DATA_DIR / "paddle_repos.json", 'r', encoding='utf-8') as f:
+        paddle_repos = json.load(f)
+    for repo in paddle_repos:
+        try:
+            convert_repo(repo['full_name'], args.format)
+            logger.info(f"Converted {repo['full_name']} to {args.format}")
+        except Exception as e:
+            logger.error(f"Error converting {repo['full_name']}: {e}")
+    print('done')
@@ -2,7 +2,9 @@ import yaml
 import json
 import os
 import logging
+from functools import cache
 
+@cache  # 进程内只读取一次，返回的dict不应修改
 def extension_to_language() -> dict:
     '''
     获取扩展名到编程语言的映射
@@ -0,0 +1,99 @@
+import os
+import json
+import shutil
+import logging
+import subprocess
+from pathlib import Path
+
+from config import MIRROR_DIR
+
+logger = logging.getLogger(__name__)
+
+ROOT = Path(MIRROR_DIR)
+RECORDED = ROOT / "recorded.json"  # 各仓库已写入数据集的最新commit：{repo: sha}
+
+def mirror_path(repo_full_name: str) -> Path:
+    repo_owner, repo_name = repo_full_name.split('/')
+    return ROOT / f"{repo_owner}_{repo_name}.git"
+
+def _git(*args):
+    return subprocess.run(['git', *args], check=True, capture_output=True, text=True).stdout.strip()
+
+def sync(repo_full_name: str, url: str | None = None) -> Path:
+    """
+    获取仓库的本地镜像并更新到最新，返回镜像路径
+    首次clone为不含文件内容的bare仓库（--filter=blob:none，只下载commit和目录树），之后每次只fetch新的commit；
+    只同步分支和tag，不同步github的 refs/pull/*
+    url 只在首次clone时使用，默认为https地址
+    """
+    path = mirror_path(repo_full_name)
+    if path.exists():
+        _git('-C', str(path), 'fetch', '--quiet', '--prune', '--tags', 'origin')
+        return path
+
+    url = url or f"https://github.com/{repo_full_name}.git"
+    logger.info(f"Creating mirror of {repo_full_name} in {path}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")  # clone完成后再改名，中断时不会留下不完整的镜像
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    _git('clone', '--quiet', '--bare', '--filter=blob:none', url, str(tmp_path))
+    _git('-C', str(tmp_path), 'config', 'remote.origin.fetch', '+refs/heads/*:refs/heads/*')
+    os.replace(tmp_path, path)
+    return path
+
+def head(path: str | Path) -> str:
+    """
+    镜像默认分支的最新commit
+    """
+    return _git('-C', str(path), 'rev-parse', 'HEAD')
+
+def is_ancestor(path: str | Path, sha: str, descendant: str) -> bool:
+    """
+    sha 是否在 descendant 的历史中（sha不存在时为False）
+    """
+    result = subprocess.run(['git', '-C', str(path), 'merge-base', '--is-ancestor', sha, descendant],
+                            capture_output=True)
+    return result.returncode == 0
+
+def rev_list(path: str | Path, *revisions: str) -> list[str]:
+    """
+    版本范围内的commit，顺序与git log相同（新的在前）；只读取commit，不需要文件内容
+    """
+    output = _git('-C', str(path), 'rev-list', *revisions)
+    return output.split('\n') if output else []
+
+def backfill(path: str | Path):
+    """
+    一次下载镜像中缺少的全部文件内容（一个pack，大小相当于一次完整clone），只在首次需要时进行；
+    镜像按需下载文件时每个commit一次请求，需要统计大量commit的增删行数时应先调用。之后的fetch仍不含文件内容
+    """
+    path = str(path)
+    if _git('-C', path, 'config', '--default', '', '--get', 'paddlelens.backfilled'):
+        return
+    logger.info(f"Downloading all file contents into {path}")
+    _git('-C', path, '-c', 'remote.origin.partialclonefilter=', 'fetch', '--quiet', '--refetch', 'origin')
+    _git('-C', path, 'config', 'paddlelens.backfilled', 'true')
+
+def _load_recorded() -> dict:
+    if not RECORDED.exists():
+        return {}
+    with open(RECORDED, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def recorded(repo_full_name: str) -> str | None:
+    """
+    上次写入数据集的最新commit，没有记录时返回None
+    """
+    return _load_recorded().get(repo_full_name)
+
+def record(repo_full_name: str, sha: str):
+    """
+    记录已写入数据集的最新commit，下次只解析其后的commit
+    """
+    data = _load_recorded()
+    data[repo_full_name] = sha
+    ROOT.mkdir(parents=True, exist_ok=True)
+    tmp_file = RECORDED.with_name(RECORDED.name + ".tmp")
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_file, RECORDED)
@@ -0,0 +1,171 @@
+import os
+import time
+import pickle
+import logging
+import threading
+from uuid import uuid4
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from config import JOB_WORKERS, JOB_MAX_PENDING, JOB_TTL, JOB_DIR, BATCH_JOB_WORKERS
+
+logger = logging.getLogger(__name__)
+
+class JobQueueFull(Exception):
+    """
+    排队的任务过多
+    """
+
+class Job:
+    """
+    一个后台分析任务，stage/stages 表示当前进行到的阶段
+    状态每次变化时写入 job_dir，任意worker进程都可以查询
+    """
+    def __init__(self, kind: str, stages: tuple[str, ...], job_dir: Path):
+        self.id = uuid4().hex
+        self.kind = kind
+        self.stages = list(stages)
+        self.stage = None
+        self.status = "pending"  # pending -> running -> done / failed
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self.job_dir = job_dir
+
+    @property
+    def path(self) -> Path:
+        return self.job_dir / f"{self.id}.pkl"
+
+    def set_stage(self, stage: str):
+        self.stage = stage
+        self.save()
+
+    def save(self):
+        """
+        先写入不含结果的状态（读取状态、清理过期任务时只需读取这一部分），再写入整个任务
+        """
+        self.job_dir.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp, 'wb') as f:
+            pickle.dump({"status": self.status, "finished_at": self.finished_at}, f)
+            pickle.dump(self, f)
+        os.replace(tmp, self.path)
+
+    def to_dict(self) -> dict:
+        done = self.stages.index(self.stage) if self.stage in self.stages else 0
+        if self.status == "done":
+            done = len(self.stages)
+        return {
+            "job_id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "stages": self.stages,
+            "progress": round(done / len(self.stages), 2) if self.stages else None,
+            "result": self.result,
+            "error": self.error,
+        }
+
+class JobManager:
+    """
+    用有限大小的线程池执行分析任务；批量任务运行时间长，使用单独的线程池，不占用普通任务的并发数
+    任务状态保存在 job_dir（多个worker进程共享），完成的任务保留 ttl 秒以供查询
+    """
+    def __init__(self, max_workers: int, max_pending: int, ttl: float, job_dir: str | Path, batch_workers: int = 1):
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self.job_dir = Path(job_dir)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._batch_executor = ThreadPoolExecutor(max_workers=batch_workers, thread_name_prefix="batch_job")
+        self._jobs = {}  # job_id -> Job，本进程提交、尚未完成的任务
+        self._lock = threading.Lock()
+
+    def _expire(self):
+        """
+        删除完成超过 ttl 秒的任务文件（包括其他worker进程的任务）
+        """
+        now = time.time()
+        for path in self.job_dir.glob("*.pkl"):
+            try:
+                if now - path.stat().st_mtime <= self.ttl:
+                    continue
+                with open(path, 'rb') as f:
+                    header = pickle.load(f)
+                if header["finished_at"] is not None and now - header["finished_at"] > self.ttl:
+                    path.unlink()
+            except (OSError, pickle.UnpicklingError, EOFError):
+                continue
+
+    def submit(self, kind: str, fn, stages: tuple[str, ...] = (), batch: bool = False) -> Job:
+        """
+        提交任务，fn(job) 返回任务结果，可调用 job.set_stage 报告进度；batch=True 时在批量任务的线程池中执行
+        """
+        job = Job(kind, stages, self.job_dir)
+        with self._lock:
+            self._expire()
+            pending = sum(1 for j in self._jobs.values() if j.status == "pending")
+            if pending >= self.max_pending:
+                raise JobQueueFull(f"Too many pending jobs: {pending}")
+            self._jobs[job.id] = job
+        job.save()
+        executor = self._batch_executor if batch else self._executor
+        executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job: Job, fn):
+        job.status = "running"
+        try:
+            job.save()
+            job.result = fn(job)
+            job.status = "done"
+        except Exception as e:
+            logger.error(f"Job {job.id} ({job.kind}) failed: {e}")
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = time.time()
+            self._finish(job)
+
+    def _finish(self, job: Job):
+        try:
+            job.save()
+        except Exception as e:
+            logger.error(f"Error saving job {job.id}: {e}")
+        with self._lock:
+            self._jobs.pop(job.id, None)
+
+    def get(self, job_id: str) -> Job | None:
+        """
+        本进程未完成的任务直接返回，其余从 job_dir 读取
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job
+        if not job_id.isalnum():
+            return None
+        try:
+            with open(self.job_dir / f"{job_id}.pkl", 'rb') as f:
+                header = pickle.load(f)
+                if header["finished_at"] is not None and time.time() - header["finished_at"] > self.ttl:
+                    return None
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+
+    def shutdown(self):
+        """
+        停止线程池；本进程还未完成的任务标记为失败，避免其他worker一直查询到进行中
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._batch_executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            unfinished = list(self._jobs.values())
+        for job in unfinished:
+            job.status = "failed"
+            job.error = "服务已停止"
+            job.finished_at = time.time()
+            self._finish(job)
+
+jobs = JobManager(JOB_WORKERS, JOB_MAX_PENDING, JOB_TTL, JOB_DIR, BATCH_JOB_WORKERS)
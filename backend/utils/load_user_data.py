@@ -1,9 +1,17 @@
 import json
 from datetime import datetime, timezone
+from pathlib import Path
 import logging
 
+from utils import dataset
+
+logger = logging.getLogger(__name__)
+
 NOWDATE = datetime(2025, 6, 30, tzinfo=timezone.utc)
 
+# 开发者分析所需的数据，每项对应快照目录中的一个json文件
+SNAPSHOT_KEYS = ('info', 'commits', 'prs', 'issues', 'review_prs', 'comment_prs_issues', 'repos_can_merge')
+
 def user_commits_in_repo(username, repo_full_name):
     """
     获取指定用户在指定仓库的commit信息
@@ -178,13 +186,204 @@ def user_comment_prs_issues_in_repo(username, repo_full_name):
 
     return comment_prs_issues_list
 
+def load_repo_file(kind, repo_full_name):
+    """
+    读取指定仓库的commits/prs/issues数据（parquet优先，json回退），失败时返回None
+    """
+    try:
+        return dataset.load_records(repo_full_name, kind)
+    except Exception as e:
+        logger.error(f"Error fetching {kind} for {repo_full_name}: {e}")
+        return None
+
+def load_user_file(kind, repo_full_name, username, columns, pair_columns=()):
+    """
+    读取指定仓库中username参与的commits/prs/issues记录（见 dataset.load_user_records），失败时返回None
+    """
+    try:
+        return dataset.load_user_records(repo_full_name, kind, username, columns, pair_columns)
+    except Exception as e:
+        logger.error(f"Error fetching {kind} for {repo_full_name}: {e}")
+        return None
+
+def before_nowdate(item):
+    """
+    判断记录的创建时间是否在NOWDATE之前，时间无法解析的记录视为无效
+    """
+    try:
+        return datetime.fromisoformat(item['created_at']) <= NOWDATE
+    except (KeyError, TypeError, ValueError):
+        return False
+
+def user_data_in_repo(username, repo_full_name):
+    """
+    一次扫描获取指定用户在指定仓库的全部贡献信息
+    每个数据文件只读取一次，同时得到commit、pr、issue、review、comment和merge权限，
+    结果与分别调用上面的 user_*_in_repo 函数一致
+    """
+    data = {
+        'commits': [],
+        'prs': [],
+        'issues': [],
+        'review_prs': [],
+        'comment_prs_issues': [],
+        'can_merge': False,
+    }
+
+    # 只读取该用户参与的记录，再按原来的条件判断
+    commits = load_user_file('commits', repo_full_name, username, ['author']) or []
+    for commit in commits:
+        if commit['author'] == username and before_nowdate(commit):
+            data['commits'].append(commit)
+
+    prs = load_user_file('prs', repo_full_name, username, ['user', 'merged_by'], ['review_by', 'comment_by']) or []
+    for pr in prs:
+        if pr.get('merged_by') == username: # merge权限不受NOWDATE限制
+            data['can_merge'] = True
+        if not before_nowdate(pr):
+            continue
+        if pr['user'] == username:
+            data['prs'].append(pr)
+        if any(review[0] == username for review in pr.get('review_by') or []):
+            data['review_prs'].append(pr)
+        if any(comment[0] == username for comment in pr.get('comment_by') or []):
+            data['comment_prs_issues'].append(pr)
+
+    issues = load_user_file('issues', repo_full_name, username, ['user'], ['comment_by']) or []
+    for issue in issues:
+        if 'error' in issue: # 可能会有deleted issue
+            continue
+        if not before_nowdate(issue):
+            continue
+        if issue['user'] == username:
+            data['issues'].append(issue)
+        if any(comment[0] == username for comment in issue.get('comment_by') or []):
+            data['comment_prs_issues'].append(issue)
+
+    return data
+
+def user_data(username, repos):
+    """
+    获取指定用户在所有仓库中的全部贡献信息
+    优先使用倒排索引（utils.user_index），只读取该用户自己的记录；索引不可用时逐仓库扫描
+    """
+    from utils import user_index
+
+    data = {
+        'commits': [],
+        'prs': [],
+        'issues': [],
+        'review_prs': [],
+        'comment_prs_issues': [],
+        'repos_can_merge': [],
+    }
+    try:
+        user_index.update_index(repos)
+        version = user_index.current() # 同一次查询只读取这一个版本，期间重建不会混用新旧文件
+        postings = user_index.lookup(version, username)
+        for repo_full_name in repos: # 保持paddle_repos.json中的仓库顺序
+            views = postings.get(repo_full_name)
+            if not views:
+                continue
+            for key in ['commits', 'prs', 'issues', 'review_prs']:
+                data[key].extend(user_index.read_rows(version, repo_full_name, user_index.VIEWS[key], views.get(key, [])))
+            data['comment_prs_issues'].extend(user_index.read_rows(version, repo_full_name, 'prs', views.get('comment_prs', [])))
+            data['comment_prs_issues'].extend(user_index.read_rows(version, repo_full_name, 'issues', views.get('comment_issues', [])))
+            if views.get('merged'):
+                data['repos_can_merge'].append(repo_full_name)
+        return data
+    except OSError as e:
+        logger.warning(f"User index unavailable, scanning all repos: {e}")
+
+    for key in data:
+        data[key] = []
+    for repo_full_name in repos:
+        repo_data = user_data_in_repo(username, repo_full_name)
+        for key in ['commits', 'prs', 'issues', 'review_prs', 'comment_prs_issues']:
+            data[key].extend(repo_data[key])
+        if repo_data['can_merge']:
+            data['repos_can_merge'].append(repo_full_name)
+    return data
+
+def users_data(repos, usernames=None):
+    """
+    一次扫描获取多个用户在所有仓库中的全部贡献信息（批量分析时使用），返回 {用户名: 数据}
+    每个数据文件只读取一次并按login分组；usernames 为None时包含所有出现过的用户
+    每个用户的结果与 user_data 一致
+    """
+    def empty():
+        return {
+            'commits': [],
+            'prs': [],
+            'issues': [],
+            'review_prs': [],
+            'comment_prs_issues': [],
+            'repos_can_merge': [],
+        }
+    wanted = set(usernames) if usernames is not None else None
+    result = {username: empty() for username in usernames} if usernames is not None else {}
+    def add(login, key, item):
+        if login is None or (wanted is not None and login not in wanted):
+            return
+        data = result.get(login)
+        if data is None:
+            data = result[login] = empty()
+        lst = data[key]
+        if not lst or lst[-1] is not item: # 同一条记录只记一次
+            lst.append(item)
+
+    # 与 user_data_in_repo 的判断保持一致
+    for repo_full_name in repos:
+        for commit in load_repo_file('commits', repo_full_name) or []:
+            if before_nowdate(commit):
+                add(commit['author'], 'commits', commit)
+        for pr in load_repo_file('prs', repo_full_name) or []:
+            if pr.get('merged_by') is not None: # merge权限不受NOWDATE限制
+                add(pr['merged_by'], 'repos_can_merge', repo_full_name)
+            if not before_nowdate(pr):
+                continue
+            add(pr['user'], 'prs', pr)
+            for review in pr.get('review_by') or []:
+                add(review[0], 'review_prs', pr)
+            for comment in pr.get('comment_by') or []:
+                add(comment[0], 'comment_prs_issues', pr)
+        for issue in load_repo_file('issues', repo_full_name) or []:
+            if 'error' in issue: # 可能会有deleted issue
+                continue
+            if not before_nowdate(issue):
+                continue
+            add(issue['user'], 'issues', issue)
+            for comment in issue.get('comment_by') or []:
+                add(comment[0], 'comment_prs_issues', issue)
+    return result
+
+def save_snapshot(data, user_cache_dir):
+    """
+    将开发者数据保存到目录中（调试用），每项一个json文件
+    """
+    user_cache_dir = Path(user_cache_dir)
+    user_cache_dir.mkdir(parents=True, exist_ok=True)
+    for key in SNAPSHOT_KEYS:
+        with open(user_cache_dir / f"{key}.json", 'w', encoding='utf-8') as f:
+            json.dump(data[key], f, ensure_ascii=False, indent=4)
+
+def load_snapshot(user_cache_dir, username=None):
+    """
+    从 save_snapshot 保存的目录读取开发者数据
+    """
+    user_cache_dir = Path(user_cache_dir)
+    data = {'username': username or user_cache_dir.name.split("_")[0]}
+    for key in SNAPSHOT_KEYS:
+        with open(user_cache_dir / f"{key}.json", 'r', encoding='utf-8') as f:
+            data[key] = json.load(f)
+    return data
+
 if __name__ == "__main__":
 
     logging.basicConfig(
         format="%(asctime)s (PID %(process)d) [%(levelname)s] %(filename)s:%(lineno)d %(message)s",
         level=logging.INFO,
     )
-    logger = logging.getLogger(__name__)
 
     token = ''
     # username = 'dune0310421'
@@ -0,0 +1,135 @@
+import os
+import time
+import functools
+from contextlib import contextmanager
+
+# prometheus_client为可选依赖：未安装时各函数不做任何事，/metrics 返回503
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Gauge, Histogram
+except ImportError:
+    prometheus_client = None
+
+# 多个worker进程时设置 PROMETHEUS_MULTIPROC_DIR，各进程的指标写入该目录，由 /metrics 汇总
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+CONTENT_TYPE = prometheus_client.CONTENT_TYPE_LATEST if prometheus_client else "text/plain"
+
+# 分析阶段从毫秒级（缓存、本地指标）到分钟级（首次获取数据、github限流等待）
+STAGE_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+if prometheus_client:
+    REQUEST_SECONDS = Histogram(
+        "paddlelens_request_seconds", "HTTP request latency",
+        ["method", "endpoint", "status"], buckets=STAGE_BUCKETS)
+    STAGE_SECONDS = Histogram(
+        "paddlelens_stage_seconds", "Latency of analysis stages",
+        ["analysis", "stage"], buckets=STAGE_BUCKETS)
+    GITHUB_REQUESTS = Counter(
+        "paddlelens_github_requests_total", "Requests sent to GitHub",
+        ["api", "status"])
+    GITHUB_RATE_LIMIT = Gauge(
+        "paddlelens_github_rate_limit_remaining", "Remaining GitHub API rate limit as last reported by GitHub",
+        ["api"], multiprocess_mode="mostrecent")
+    CACHE_REQUESTS = Counter(
+        "paddlelens_cache_requests_total", "Result cache lookups",
+        ["cache", "result"])
+    SCRATCH_ENTRIES = Gauge(
+        "paddlelens_scratch_entries", "Entries in scratch directories",
+        ["space"], multiprocess_mode="mostrecent")
+    SCRATCH_BYTES = Gauge(
+        "paddlelens_scratch_bytes", "Bytes used by scratch directories",
+        ["space"], multiprocess_mode="mostrecent")
+
+def observe_stage(analysis: str, stage: str, seconds: float):
+    if prometheus_client:
+        STAGE_SECONDS.labels(analysis, stage).observe(seconds)
+
+@contextmanager
+def timer(analysis: str, stage: str):
+    """
+    统计一个分析阶段的耗时（出错时也统计）
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(analysis, stage, time.perf_counter() - start)
+
+def timed(analysis: str, stage: str | None = None):
+    """
+    装饰器：统计函数耗时，stage默认为函数名
+    """
+    def decorator(fn):
+        name = stage or fn.__name__
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(analysis, name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def github_request(api: str, status, remaining=None):
+    """
+    记录一次github请求；status为HTTP状态码或 "error"，remaining为响应中的剩余限额
+    """
+    if not prometheus_client:
+        return
+    GITHUB_REQUESTS.labels(api, str(status)).inc()
+    if remaining is not None:
+        GITHUB_RATE_LIMIT.labels(api).set(int(remaining))
+
+def github_response(api: str, response):
+    """
+    记录一次requests的响应，剩余限额取自 X-RateLimit-Remaining
+    """
+    github_request(api, response.status_code, response.headers.get("X-RateLimit-Remaining"))
+
+def cache_lookup(cache: str, hit: bool):
+    if prometheus_client:
+        CACHE_REQUESTS.labels(cache, "hit" if hit else "miss").inc()
+
+def scratch_usage(space: str, stats: dict):
+    if prometheus_client:
+        SCRATCH_ENTRIES.labels(space).set(stats["entries"])
+        SCRATCH_BYTES.labels(space).set(stats["bytes"])
+
+def render() -> bytes | None:
+    """
+    Prometheus文本格式的全部指标，未安装prometheus_client时返回None
+    """
+    if not prometheus_client:
+        return None
+    if MULTIPROC_DIR:
+        from prometheus_client import CollectorRegistry, multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return prometheus_client.generate_latest(registry)
+    return prometheus_client.generate_latest()
+
+class MetricsMiddleware:
+    """
+    按 (方法, 路由模板, 状态码) 统计请求耗时；用路由模板而不是实际路径，避免 /artifacts/{name} 等产生大量标签
+    流式响应统计到响应结束为止
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not prometheus_client:
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            endpoint = getattr(route, "path", None) or "unmatched"
+            REQUEST_SECONDS.labels(scope["method"], endpoint, str(status)).observe(time.perf_counter() - start)
@@ -0,0 +1,101 @@
+import re
+import random
+import logging
+import functools
+from uuid import uuid4
+from pathlib import Path
+from contextvars import ContextVar
+
+from config import PROFILE_SAMPLE_RATE, PROFILE_HEADER, PROFILE_DIR, PROFILE_MAX_BYTES, PROFILE_MAX_AGE
+from utils.scratch import ScratchSpace
+
+logger = logging.getLogger(__name__)
+
+# pyinstrument为可选依赖（pip install pyinstrument），未安装时不开启
+try:
+    from pyinstrument import Profiler
+    from pyinstrument.renderers import SpeedscopeRenderer
+except ImportError:
+    Profiler = None
+
+# 抽样或设置 PROFILE_HEADER 时开启；未开启时不安装中间件，profiled 原样返回被装饰的函数，没有任何额外开销
+ENABLED = Profiler is not None and (PROFILE_SAMPLE_RATE > 0 or PROFILE_HEADER)
+
+HEADER = b"x-profile"
+ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+# 性能分析结果（speedscope格式），与临时目录相同的清理策略
+space = ScratchSpace(PROFILE_DIR, PROFILE_MAX_BYTES, PROFILE_MAX_AGE)
+
+# 当前请求需要分析时为 {"id": 请求id, "saved": 是否已保存}，由中间件设置，随上下文传到执行接口函数的线程
+_current = ContextVar("profile_request", default=None)
+
+def path(request_id: str) -> Path | None:
+    """
+    请求id对应的分析结果路径，id不合法时返回None
+    """
+    if not ID_PATTERN.match(request_id):
+        return None
+    return space.root / f"{request_id}.speedscope.json"
+
+def _save(request_id: str, profiler):
+    file = path(request_id)
+    space.root.mkdir(parents=True, exist_ok=True)
+    file.write_text(profiler.output(renderer=SpeedscopeRenderer()), encoding="utf-8")
+    logger.info(f"Saved profile of request {request_id} to {file}")
+
+def profiled(fn):
+    """
+    装饰接口函数：中间件选中的请求在执行函数的线程中做统计采样分析，结果按请求id保存
+    同步接口在线程池中执行，在中间件中采样只能看到事件循环，因此在函数所在线程中采样
+    """
+    if not ENABLED:
+        return fn
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        current = _current.get()
+        if current is None:
+            return fn(*args, **kwargs)
+        profiler = Profiler(async_mode="disabled")
+        profiler.start()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.stop()
+            try:
+                _save(current["id"], profiler)
+                current["saved"] = True
+            except Exception as e:
+                logger.error(f"Error saving profile of request {current['id']}: {e}")
+    return wrapper
+
+class ProfilingMiddleware:
+    """
+    按 PROFILE_SAMPLE_RATE 抽样，或在 PROFILE_HEADER 开启时选中带 X-Profile 头的请求；
+    保存了分析结果时响应头 X-Profile-Id 为请求id，结果通过 /profiles/{id} 获取
+    """
+    def __init__(self, app):
+        self.app = app
+
+    def _select(self, scope) -> bool:
+        if PROFILE_HEADER and any(name == HEADER for name, _ in scope["headers"]):
+            return True
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._select(scope):
+            await self.app(scope, receive, send)
+            return
+        current = {"id": uuid4().hex, "saved": False}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and current["saved"]:
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile-id", current["id"].encode())]
+            await send(message)
+
+        token = _current.set(current)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
@@ -2,9 +2,13 @@ import json
 import logging
 import math
 import os
+from functools import cache
+
+from utils import dataset
 
 logger = logging.getLogger(__name__)
 
+@cache  # 进程内只读取一次，返回的dict不应修改
 def project_weights() -> dict:
     """
     获取项目难度
@@ -24,6 +28,7 @@ def project_weights() -> dict:
 
     return weight
 
+@cache
 def module_weights() -> dict:
     """
     获取模块重要度
@@ -36,9 +41,7 @@ def module_weights() -> dict:
             paddle_repos = json.load(f)
         module_weights = {}
         for repo in paddle_repos:
-            repo_owner, repo_name = repo['full_name'].split('/')            
-            with open(f"data/paddle_commits/{repo_owner}_{repo_name}_commits.json", 'r', encoding='utf-8') as f:
-                commits = json.load(f)
+            commits = dataset.load_records(repo['full_name'], 'commits', columns=['files']) # 只需要files列
             modules = {}
             for commit in commits:
                 files = commit['files']
@@ -1,11 +1,43 @@
 import time
 import logging
 from typing import *
+import requests
 from github import Github
 from github import RateLimitExceededException, UnknownObjectException
 
+from utils import metrics
+
 T = TypeVar("T")
 logger = logging.getLogger(__name__)
+GITHUB_GRAPHQL_ENDPOINT = "https://api.github.com/graphql"
+
+class GraphQLError(Exception):
+    """
+    GraphQL查询返回错误，或多次重试后仍失败
+    """
+
+class _RestMetricsFilter(logging.Filter):
+    """
+    PyGithub对每个实际发出的请求在 github.Requester 上记一条debug日志（含状态码和响应头），由此统计REST请求，
+    包括分页迭代、懒加载对象触发的请求；没有发出请求的调用不计入。原本未开启debug时这些日志不再输出
+    """
+    def __init__(self, keep_debug: bool):
+        super().__init__()
+        self.keep_debug = keep_debug
+
+    def filter(self, record):
+        if record.msg == PYGITHUB_RESPONSE_LOG and len(record.args) == 9:
+            status, headers = record.args[6], record.args[7]
+            metrics.github_request("rest", status, headers.get("x-ratelimit-remaining"))
+        return record.levelno > logging.DEBUG or self.keep_debug
+
+# github.Requester 中每个响应的日志格式：verb, scheme, hostname, url, 请求头, 请求体, 状态码, 响应头, 响应体
+PYGITHUB_RESPONSE_LOG = "%s %s://%s%s %s %s ==> %i %s %s"
+
+if metrics.prometheus_client:
+    _requester_logger = logging.getLogger("github.Requester")
+    _requester_logger.addFilter(_RestMetricsFilter(_requester_logger.isEnabledFor(logging.DEBUG)))
+    _requester_logger.setLevel(logging.DEBUG)
 
 def request_github(
         gh: Github, gh_func: Callable[..., T], params: Tuple = (), default: Any = None
@@ -16,8 +48,7 @@ def request_github(
     """
     for _ in range(0, 3):  # Max retry 3 times
         try:
-            data = gh_func(*params)
-            return data
+            return gh_func(*params)
         except RateLimitExceededException as ex:
             logger.info("{}: {}".format(type(ex), ex))
             sleep_time = gh.rate_limiting_resettime - time.time() + 10
@@ -27,6 +58,103 @@ def request_github(
             logger.error("{}: {}".format(type(ex), ex))
             break
         except Exception as ex:
+            if isinstance(ex, requests.RequestException):  # 没有收到响应，不会记录在PyGithub的日志中
+                metrics.github_request("rest", "error")
+            logger.error("{}: {}".format(type(ex), ex))
+            time.sleep(5)
+    return default
+
+
+def _wait_rate_limit(response):
+    """
+    限流时等待：优先使用Retry-After（secondary rate limit），否则等到X-RateLimit-Reset
+    """
+    if response.headers.get("Retry-After"):
+        sleep_time = float(response.headers["Retry-After"])
+    else:
+        sleep_time = int(response.headers.get("X-RateLimit-Reset", time.time() + 60)) - time.time() + 10
+    logger.info("Rate limit reached, wait for {} seconds...".format(sleep_time))
+    time.sleep(max(1.0, sleep_time))
+
+def request_graphql(token: str, query: str, variables: Optional[dict] = None, retries: int = 3) -> dict:
+    """
+    Send a GraphQL query and return its `data`. Waits for the rate limit to reset
+      when it is exhausted; other failures are retried and then raised as GraphQLError.
+    """
+    headers = {"Authorization": f"Bearer {token}"}
+    payload = {"query": query, "variables": variables or {}}
+    error = None
+    for _ in range(0, retries):
+        try:
+            response = requests.post(GITHUB_GRAPHQL_ENDPOINT, headers=headers, json=payload, timeout=120)
+        except requests.RequestException as ex:
+            metrics.github_request("graphql", "error")
             logger.error("{}: {}".format(type(ex), ex))
+            error = ex
+            time.sleep(5)
+            continue
+        metrics.github_response("graphql", response)
+        if response.status_code in (403, 429) and (response.headers.get("Retry-After")
+                                                   or response.headers.get("X-RateLimit-Remaining") == "0"):
+            _wait_rate_limit(response)
+            continue
+        if response.status_code != 200:  # 查询过重时返回502等，稍后重试
+            logger.error("GraphQL query failed with {}: {}".format(response.status_code, response.text[:200]))
+            error = response.text[:200]
             time.sleep(5)
-    return default
\ No newline at end of file
+            continue
+        body = response.json()
+        errors = body.get("errors")
+        if errors and any(e.get("type") == "RATE_LIMITED" for e in errors):
+            _wait_rate_limit(response)
+            continue
+        if errors:
+            raise GraphQLError(errors)
+        return body["data"]
+    raise GraphQLError("GraphQL query failed after {} attempts: {}".format(retries, error))
+
+
+# 分页获取时用到的GraphQL片段和转换函数
+PAGE_INFO = "pageInfo { hasNextPage endCursor }"
+ACTOR_FIELDS = "author { login __typename }"
+
+def graphql_connection(name: str, first: int, fields: str) -> str:
+    """
+    连接字段的查询片段：首页的节点及分页信息
+    """
+    return f"{name}(first: {first}) {{ {PAGE_INFO} nodes {{ {fields} }} }}"
+
+def graphql_nodes(token: str, node_id: str, type_name: str, name: str, connection: dict, fields: str) -> list:
+    """
+    连接的全部节点：首页之外的部分通过 node(id) 继续分页获取
+    """
+    nodes = list(connection['nodes'])
+    page = connection['pageInfo']
+    query = f"""
+    query ($id: ID!, $cursor: String) {{
+        node(id: $id) {{
+            ... on {type_name} {{
+                {name}(first: 100, after: $cursor) {{ {PAGE_INFO} nodes {{ {fields} }} }}
+            }}
+        }}
+    }}
+    """
+    while page['hasNextPage']:
+        more = request_graphql(token, query, {"id": node_id, "cursor": page['endCursor']})['node'][name]
+        nodes.extend(more['nodes'])
+        page = more['pageInfo']
+    return nodes
+
+def graphql_login(actor: Optional[dict]) -> Optional[str]:
+    """
+    与REST一致：机器人账号的login带[bot]后缀，已删除的账号为None
+    """
+    if not actor:
+        return None
+    return f"{actor['login']}[bot]" if actor.get('__typename') == 'Bot' else actor['login']
+
+def graphql_time(ts: Optional[str]) -> Optional[str]:
+    """
+    与PyGithub的 datetime.isoformat() 一致：2024-01-01T00:00:00+00:00
+    """
+    return ts.replace('Z', '+00:00') if ts else None
@@ -0,0 +1,151 @@
+import os
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+class ResultCache:
+    """
+    进程内LRU缓存，可选过期时间(ttl, 秒)和磁盘存储(disk_dir，多个worker进程共享)
+    name 用于 /metrics 中的命中率统计
+    """
+    def __init__(self, maxsize: int = 128, ttl: float | None = None, disk_dir: str | Path | None = None,
+                 name: str = "default"):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.disk_dir = Path(disk_dir) if disk_dir else None
+        self._data = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_file(self, key) -> Path:
+        return self.disk_dir / f"{hashlib.sha1(repr(key).encode('utf-8')).hexdigest()}.pkl"
+
+    def _expired(self, expires_at) -> bool:
+        return expires_at is not None and expires_at < time.time()
+
+    def get(self, key, default=None, stale: bool = False):
+        """
+        获取缓存结果；stale=True 时过期的结果也返回（如刷新失败时兜底）
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+        if entry is None and self.disk_dir is not None:
+            try:
+                with open(self._disk_file(key), 'rb') as f:
+                    entry = pickle.load(f)
+                with self._lock:
+                    self._put(key, entry)
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                logger.warning(f"Error reading cached result for {key}: {e}")
+        if entry is None or (self._expired(entry[0]) and not stale):
+            self.misses += 1
+            metrics.cache_lookup(self.name, False)
+            return default
+        self.hits += 1
+        metrics.cache_lookup(self.name, True)
+        return entry[1]
+
+    def _put(self, key, entry):
+        self._data[key] = entry
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def set(self, key, value):
+        entry = (time.time() + self.ttl if self.ttl else None, value)
+        with self._lock:
+            self._put(key, entry)
+        if self.disk_dir is not None:
+            try:
+                self.disk_dir.mkdir(parents=True, exist_ok=True)
+                path = self._disk_file(key)
+                tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                with open(tmp, 'wb') as f:
+                    pickle.dump(entry, f)
+                os.replace(tmp, path)
+                self._prune_disk()
+            except Exception as e:
+                logger.warning(f"Error writing cached result for {key}: {e}")
+
+    def _prune_disk(self):
+        """
+        磁盘上最多保留maxsize个结果，删除最早写入的
+        """
+        files = sorted(self.disk_dir.glob("*.pkl"), key=lambda p: p.stat().st_mtime)
+        for path in files[:max(0, len(files) - self.maxsize)]:
+            path.unlink(missing_ok=True)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+        if self.disk_dir is not None:
+            for path in self.disk_dir.glob("*.pkl"):
+                path.unlink(missing_ok=True)
+
+class Abandoned(Exception):
+    """
+    负责计算的调用方中途放弃（如流式响应的客户端断开），等待的调用方应重新计算
+    """
+
+class SingleFlight:
+    """
+    合并并发的相同调用：同一个key同时只计算一次，其余调用等待并共享结果（或异常）
+    """
+    def __init__(self):
+        self._calls = {}  # key -> Future
+        self._lock = threading.Lock()
+
+    def begin(self, key) -> tuple[Future, bool]:
+        """
+        登记对key的计算，返回 (future, 是否由调用方计算)；
+        由调用方计算时，完成后须调用 finish，否则等待 future 的结果
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = self._calls[key] = Future()
+            return future, True
+
+    def finish(self, key, future: Future, result=None, error: BaseException | None = None):
+        """
+        结束 begin 登记的计算，将结果（或异常）交给等待的调用方
+        """
+        with self._lock:
+            del self._calls[key]
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def do(self, key, fn):
+        while True:
+            future, leader = self.begin(key)
+            if leader:
+                break
+            try:
+                return future.result()
+            except Abandoned:
+                continue
+        try:
+            result = fn()
+        except BaseException as e:
+            self.finish(key, future, error=e)
+            raise
+        self.finish(key, future, result)
+        return result
@@ -0,0 +1,133 @@
+import os
+import time
+import shutil
+import logging
+import threading
+from pathlib import Path
+
+from config import SCRATCH_DIR, SCRATCH_MAX_BYTES, SCRATCH_MAX_AGE
+
+logger = logging.getLogger(__name__)
+
+class ScratchSpace:
+    """
+    单次请求使用的临时目录（root下的每个子目录为一项），与 cache/ 下长期保存的预计算结果分开管理
+    超过 max_age 秒的项、以及总大小超过 max_bytes 时最早的项会被清理
+    """
+    def __init__(self, root: str | Path, max_bytes: int, max_age: float):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.evicted = 0  # 累计清理的项数
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def create(self, name: str) -> Path:
+        """
+        创建一项临时目录，返回其路径
+        """
+        path = self.root / name
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def release(self, path: str | Path):
+        """
+        用完后立即删除
+        """
+        shutil.rmtree(path, ignore_errors=True)
+
+    def _scan(self) -> list[tuple[float, int, Path]]:
+        """
+        各项的 (最近修改时间, 字节数, 路径)
+        """
+        entries = []
+        try:
+            children = list(os.scandir(self.root))
+        except FileNotFoundError:
+            return entries
+        for child in children:
+            try:
+                mtime = child.stat().st_mtime
+                size = 0
+                if child.is_dir(follow_symlinks=False):
+                    for dirpath, _, filenames in os.walk(child.path):
+                        for filename in filenames:
+                            st = os.stat(os.path.join(dirpath, filename))
+                            size += st.st_size
+                            mtime = max(mtime, st.st_mtime)
+                else:
+                    size = child.stat().st_size
+            except OSError:  # 其他进程正在删除
+                continue
+            entries.append((mtime, size, Path(child.path)))
+        return entries
+
+    def _remove(self, path: Path):
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+        self.evicted += 1
+
+    def evict(self) -> int:
+        """
+        清理过期的项，再按最近修改时间从早到晚清理，直到总大小不超过 max_bytes，返回清理的项数
+        """
+        with self._lock:
+            evicted = self.evicted
+            now = time.time()
+            entries = sorted(self._scan())
+            kept = []
+            for mtime, size, path in entries:
+                if now - mtime > self.max_age:
+                    self._remove(path)
+                else:
+                    kept.append((mtime, size, path))
+            total = sum(size for _, size, _ in kept)
+            for mtime, size, path in kept:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+            if self.evicted > evicted:
+                logger.info(f"Evicted {self.evicted - evicted} scratch entries, {total} bytes left")
+            return self.evicted - evicted
+
+    def stats(self) -> dict:
+        """
+        当前占用：项数、字节数，以及累计清理的项数
+        """
+        entries = self._scan()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "evicted": self.evicted,
+        }
+
+    def start(self, interval: float = 60):
+        """
+        启动后台清理线程
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.evict()
+                except Exception as e:
+                    logger.error(f"Error evicting scratch space: {e}")
+
+        self.evict()
+        self._thread = threading.Thread(target=run, name="scratch-evictor", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+scratch = ScratchSpace(SCRATCH_DIR, SCRATCH_MAX_BYTES, SCRATCH_MAX_AGE)
@@ -0,0 +1,47 @@
+import sys
+import base64
+import datetime
+import orjson
+from fastapi.responses import Response
+
+from utils import metrics
+
+# 与原先的 JSONResponse 输出一致：非字符串的key转为字符串
+# 不用OPT_SERIALIZE_NUMPY：其按float32精度输出float32，与原输出不一致
+OPTIONS = orjson.OPT_NON_STR_KEYS
+
+def _default(obj):
+    """
+    orjson不能直接序列化的类型
+    plotly/numpy只在已被导入时才可能出现（pandas的时间类型是datetime的子类），从sys.modules获取，不在此导入
+    """
+    go = sys.modules.get("plotly.graph_objects")
+    np = sys.modules.get("numpy")
+    if go is not None and isinstance(obj, go.Figure):
+        return obj.to_dict()  # 不用to_json：其转义的"/"等字符与原输出不一致
+    elif isinstance(obj, bytes):
+        return base64.b64encode(obj).decode()
+    elif isinstance(obj, datetime.datetime):  # 包括pd.Timestamp
+        return obj.isoformat()
+    elif isinstance(obj, datetime.timedelta):  # 包括pd.Timedelta
+        return str(obj)
+    elif isinstance(obj, (set, frozenset)):
+        return list(obj)
+    elif np is not None and isinstance(obj, np.ndarray):
+        return obj.tolist()
+    elif np is not None and isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+def dumps(obj) -> bytes:
+    """
+    将分析结果序列化为json
+    """
+    with metrics.timer("response", "serialize"):
+        return orjson.dumps(obj, default=_default, option=OPTIONS)
+
+class ORJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,295 @@
+import json
+import os
+import shutil
+import logging
+from uuid import uuid4
+from pathlib import Path
+from contextlib import contextmanager
+
+from utils.load_user_data import NOWDATE, load_repo_file, before_nowdate
+
+try:
+    import fcntl
+except ImportError:  # Windows下不加文件锁
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_DIR = Path("cache/user_index")
+VERSIONS_DIR = INDEX_DIR / "versions"  # 每次重建写入一个新的版本目录：rows/、logins.tsv、manifest.json
+CURRENT_FILE = INDEX_DIR / "CURRENT"  # 当前版本的目录名，重建完成后原子替换
+
+KINDS = ('commits', 'prs', 'issues')
+# 每种贡献视图对应的行文件
+VIEWS = {
+    'commits': 'commits',
+    'prs': 'prs',
+    'issues': 'issues',
+    'review_prs': 'prs',
+    'comment_prs': 'prs',
+    'comment_issues': 'issues',
+}
+
+_manifest_cache = (None, None)  # (版本, manifest)，本进程最近读取的manifest
+
+def _rows_file(version: Path, repo_full_name: str, kind: str) -> Path:
+    repo_owner, repo_name = repo_full_name.split('/')
+    return version / "rows" / f"{repo_owner}_{repo_name}_{kind}.jsonl"
+
+def _source_stat(repo_full_name: str) -> dict:
+    """
+    仓库数据文件的 (mtime, size)，用于判断索引是否过期
+    """
+    repo_owner, repo_name = repo_full_name.split('/')
+    stat = {}
+    for kind in KINDS:
+        try:
+            st = os.stat(f"data/paddle_{kind}/{repo_owner}_{repo_name}_{kind}.json")
+            stat[kind] = [st.st_mtime_ns, st.st_size]
+        except OSError:
+            stat[kind] = None
+    return stat
+
+def _dump(obj, path: Path):
+    """
+    先写临时文件再替换，避免其他进程读到写了一半的文件
+    """
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+@contextmanager
+def _lock():
+    INDEX_DIR.mkdir(parents=True, exist_ok=True)
+    with open(INDEX_DIR / ".lock", 'w') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def _build_repo(version: Path, repo_full_name: str) -> dict:
+    """
+    扫描一个仓库的数据文件，在版本目录中写出按行存储的记录，返回 login -> 各贡献视图的字节偏移
+    """
+    (version / "rows").mkdir(parents=True, exist_ok=True)
+    offsets = {}
+    records = {}
+    for kind in KINDS:
+        records[kind] = load_repo_file(kind, repo_full_name) or []
+        offsets[kind] = []
+        path = _rows_file(version, repo_full_name, kind)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp, 'wb') as f:
+            for record in records[kind]:
+                offsets[kind].append(f.tell())
+                f.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+        os.replace(tmp, path)
+
+    postings = {}
+    def add(login, view, offset):
+        if login is None:
+            return
+        views = postings.setdefault(login, {})
+        lst = views.setdefault(view, [])
+        if not lst or lst[-1] != offset: # 同一条记录只记一次
+            lst.append(offset)
+
+    # 与 load_user_data.user_data_in_repo 的判断保持一致
+    for commit, offset in zip(records['commits'], offsets['commits']):
+        if before_nowdate(commit):
+            add(commit['author'], 'commits', offset)
+    for pr, offset in zip(records['prs'], offsets['prs']):
+        if pr.get('merged_by') is not None: # merge权限不受NOWDATE限制
+            postings.setdefault(pr['merged_by'], {})['merged'] = True
+        if not before_nowdate(pr):
+            continue
+        add(pr['user'], 'prs', offset)
+        for review in pr.get('review_by') or []:
+            add(review[0], 'review_prs', offset)
+        for comment in pr.get('comment_by') or []:
+            add(comment[0], 'comment_prs', offset)
+    for issue, offset in zip(records['issues'], offsets['issues']):
+        if 'error' in issue: # 可能会有deleted issue
+            continue
+        if not before_nowdate(issue):
+            continue
+        add(issue['user'], 'issues', offset)
+        for comment in issue.get('comment_by') or []:
+            add(comment[0], 'comment_issues', offset)
+    return postings
+
+def current() -> Path | None:
+    """
+    当前版本的索引目录，还没有索引时返回None；同一次查询的 lookup 和 read_rows 应使用同一个版本
+    """
+    try:
+        name = CURRENT_FILE.read_text(encoding='utf-8').strip()
+    except FileNotFoundError:
+        return None
+    return VERSIONS_DIR / name
+
+def _manifest(version: Path | None) -> dict:
+    """
+    版本的manifest：{'nowdate': ..., 'repos': {repo: 数据文件的stat}}；版本目录发布后不再修改，读取一次即可
+    """
+    global _manifest_cache
+    if version is None:
+        return {'nowdate': None, 'repos': {}}
+    if _manifest_cache[0] != version:
+        try:
+            with open(version / "manifest.json", 'r', encoding='utf-8') as f:
+                _manifest_cache = (version, json.load(f))
+        except FileNotFoundError:
+            return {'nowdate': None, 'repos': {}}
+    return _manifest_cache[1]
+
+def _changes(manifest: dict, stats: dict) -> tuple[list[str], list[str]]:
+    """
+    需要重建的仓库和需要移除的仓库；NOWDATE变化时全部重建
+    """
+    indexed = manifest['repos'] if manifest.get('nowdate') == NOWDATE.isoformat() else {}
+    stale = [repo for repo in stats if indexed.get(repo) != stats[repo]]
+    removed = [repo for repo in indexed if repo not in stats]
+    return stale, removed
+
+def _line(login: str, repo_views: dict) -> bytes:
+    return (json.dumps(login, ensure_ascii=False) + '\t' + json.dumps(repo_views, ensure_ascii=False) + '\n').encode('utf-8')
+
+def _login(line: bytes) -> str:
+    return json.loads(line[:line.index(b'\t')])
+
+def _write_logins(previous: Path | None, version: Path, new_postings: dict, kept: set):
+    """
+    写出按login排序的 logins.tsv，每行为制表符分隔的 json(login) 和 json({repo: views})
+    旧版本中只保留未变化仓库的记录，与新记录归并（两边都已按login排序，不需要整体读入）
+    """
+    new = sorted(new_postings.items())
+    i = 0
+    path = version / "logins.tsv"
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp, 'wb') as out:
+        if previous is not None and kept:
+            with open(previous / "logins.tsv", 'rb') as f:
+                for line in f:
+                    login = _login(line)
+                    while i < len(new) and new[i][0] < login:
+                        out.write(_line(*new[i]))
+                        i += 1
+                    repo_views = {r: v for r, v in json.loads(line[line.index(b'\t') + 1:]).items() if r in kept}
+                    if i < len(new) and new[i][0] == login:
+                        repo_views.update(new[i][1])
+                        i += 1
+                    if repo_views:
+                        out.write(_line(login, repo_views))
+        for login, repo_views in new[i:]:
+            out.write(_line(login, repo_views))
+    os.replace(tmp, path)
+
+def _cleanup(keep: set):
+    """
+    删除其他版本目录（包括中断的重建），保留当前和上一个版本：可能还有请求在读取上一个版本
+    """
+    for path in VERSIONS_DIR.iterdir():
+        if path not in keep:
+            shutil.rmtree(path, ignore_errors=True)
+    # 不分版本的旧格式索引
+    for legacy in ("rows", "logins"):
+        shutil.rmtree(INDEX_DIR / legacy, ignore_errors=True)
+    (INDEX_DIR / "manifest.json").unlink(missing_ok=True)
+
+def update_index(repos: list[str]) -> list[str]:
+    """
+    增量更新倒排索引：只重建数据文件有变化（或新增、删除）的仓库，返回重建的仓库列表
+    repos 为全部飞桨仓库，不在其中的仓库会从索引中移除
+    索引是最新的时不加锁直接返回；重建时加锁，写出新的版本目录后原子替换 CURRENT，正在读取旧版本的请求不受影响
+    """
+    stats = {repo: _source_stat(repo) for repo in repos}
+    if not any(_changes(_manifest(current()), stats)):
+        return []
+
+    with _lock():
+        previous = current()
+        manifest = _manifest(previous)
+        stale, removed = _changes(manifest, stats) # 等待锁期间其他进程可能已经重建
+        if not stale and not removed:
+            return []
+        logger.info(f"Rebuilding user index for {len(stale)} repos, removing {len(removed)} repos")
+
+        version = VERSIONS_DIR / uuid4().hex
+        (version / "rows").mkdir(parents=True)
+        new_postings = {}
+        for repo in stale:
+            for login, views in _build_repo(version, repo).items():
+                new_postings.setdefault(login, {})[repo] = views
+        # 未变化仓库的行文件直接从上一个版本链接过来
+        kept = {repo for repo in stats if repo not in stale}
+        for repo in kept:
+            for kind in KINDS:
+                src, dst = _rows_file(previous, repo, kind), _rows_file(version, repo, kind)
+                try:
+                    os.link(src, dst)
+                except OSError:
+                    shutil.copyfile(src, dst)
+        _write_logins(previous, version, new_postings, kept)
+        _dump({'nowdate': NOWDATE.isoformat(), 'repos': {repo: stats[repo] for repo in repos}}, version / "manifest.json")
+
+        tmp = CURRENT_FILE.with_name(f"{CURRENT_FILE.name}.{os.getpid()}.tmp")
+        tmp.write_text(version.name, encoding='utf-8')
+        os.replace(tmp, CURRENT_FILE)
+        _cleanup({version, previous})
+        return stale
+
+def lookup(version: Path | None, username: str) -> dict:
+    """
+    查询指定用户在各仓库中的记录偏移：{repo: {view: [offset, ...], 'merged': bool}}
+    在按login排序的 logins.tsv 中二分查找，只读取和解析该用户所在的一行
+    """
+    if version is None:
+        return {}
+    with open(version / "logins.tsv", 'rb') as f:
+        lo, hi = 0, os.fstat(f.fileno()).st_size # lo 总是行首，之前的行都小于username
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if mid:
+                f.seek(mid - 1)
+                f.readline() # 移到mid处或之后的第一个行首
+            else:
+                f.seek(0)
+            line = f.readline()
+            if line and _login(line) < username:
+                lo = f.tell()
+            else:
+                hi = mid
+        f.seek(lo)
+        line = f.readline()
+    if not line or _login(line) != username:
+        return {}
+    return json.loads(line[line.index(b'\t') + 1:])
+
+def read_rows(version: Path, repo_full_name: str, kind: str, offsets: list[int]) -> list[dict]:
+    """
+    按字节偏移读取记录，只读取需要的行；version 须与 lookup 时相同
+    """
+    rows = []
+    if not offsets:
+        return rows
+    with open(_rows_file(version, repo_full_name, kind), 'rb') as f:
+        for offset in offsets:
+            f.seek(offset)
+            rows.append(json.loads(f.readline()))
+    return rows
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        format="%(asctime)s (PID %(process)d) [%(levelname)s] %(filename)s:%(lineno)d %(message)s",
+        level=logging.INFO,
+    )
+
+    with open("data/paddle_repos.json", 'r', encoding='utf-8') as f:
+        paddle_repos = json.load(f)
+    rebuilt = update_index([repo['full_name'] for repo in paddle_repos])
+    print(f"rebuilt {len(rebuilt)} repos")
@@ -0,0 +1,91 @@
+import json
+import time
+import logging
+import threading
+
+from utils import dataset
+
+logger = logging.getLogger(__name__)
+
+# 预热状态，/ready 接口返回；degraded 为预热失败的阶段及错误，这些阶段的数据在首次请求时再加载
+state = {
+    "ready": False,
+    "stage": None,
+    "degraded": {},
+    "seconds": None,
+}
+
+def _run_stage(name: str, fn):
+    """
+    执行一个预热阶段；失败时记录后继续，不影响其余阶段和就绪状态
+    """
+    state["stage"] = name
+    logger.info(f"Warming up: {name}")
+    try:
+        fn()
+    except Exception as e:
+        logger.error(f"Warm-up failed at {name}: {e}")
+        state["degraded"][name] = str(e)
+
+def _load_repos() -> list[str]:
+    with open(dataset.DATA_DIR / "paddle_repos.json", 'r', encoding='utf-8') as f:
+        return [repo['full_name'] for repo in json.load(f)]
+
+def _dataset(repos: list):
+    repos.extend(_load_repos())
+    dataset.preload(repos)
+
+def _weights():
+    from utils.repo_util import project_weights, module_weights
+    from utils.extension_to_language import extension_to_language
+    project_weights()
+    module_weights()
+    extension_to_language()
+
+def _plots():
+    from skills.hardskill import plot_domain_skills, plot_lang_skills
+    from utils import serialize
+    plot_domain_skills({"PaddlePaddle": 1})  # 加载字体等
+    serialize.dumps(plot_lang_skills({"Python": 1}))  # 加载plotly模板和校验器
+
+def _health_cubes(repos):
+    from health.activity_cube import load_cube
+    for repo in repos:
+        try:
+            load_cube(repo)
+        except Exception as e:
+            logger.error(f"Error loading activity cube for {repo}: {e}")
+
+def warm_up(features=("skills", "health")):
+    """
+    预加载数据集和各类缓存，使首个请求与稳定状态下一样快：arrow快照，
+    skills：开发者倒排索引、项目难度/模块重要度、扩展名映射，以及绘图库的首次渲染；health：健康度每日活动表
+    只预热需要的功能，其余功能的依赖库仍按需导入
+    预热只是提前加载，某个阶段失败时（记录在 state["degraded"] 中）worker仍然就绪，相应数据在请求时再加载
+    """
+    start = time.time()
+    try:
+        repos = []
+        _run_stage("dataset", lambda: _dataset(repos))
+
+        if "skills" in features:
+            from utils import user_index
+            _run_stage("user_index", lambda: user_index.update_index(repos or _load_repos()))
+            _run_stage("weights", _weights)
+            _run_stage("plots", _plots)
+
+        if "health" in features:
+            _run_stage("health_cubes", lambda: _health_cubes(repos or _load_repos()))
+    finally:
+        state["ready"] = True
+        state["stage"] = None
+        state["seconds"] = round(time.time() - start, 3)
+        logger.info(f"Warm-up finished in {state['seconds']}s, degraded stages: {list(state['degraded']) or 'none'}")
+
+def start(features=("skills", "health")) -> threading.Thread:
+    """
+    在后台线程中预热，预热期间worker照常启动，/ready 返回未就绪
+    """
+    thread = threading.Thread(target=warm_up, args=(tuple(features),), name="warmup", daemon=True)
+    thread.start()
+    return thread
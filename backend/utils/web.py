@@ -0,0 +1,106 @@
+import gzip
+import hashlib
+import anyio.to_thread
+from starlette.datastructures import Headers, MutableHeaders
+
+try:
+    import brotli
+except ImportError:  # 未安装brotli时只使用gzip
+    brotli = None
+
+# 不压缩的响应类型：流式的SSE，以及本身已压缩的图片
+EXCLUDED_CONTENT_TYPES = ("text/event-stream", "image/")
+
+class CompressionMiddleware:
+    """
+    按Accept-Encoding压缩响应：br（需安装brotli）优先，其次gzip
+    只压缩一次性返回的响应，流式响应和小于minimum_size字节的响应原样返回
+    """
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 5,
+                 thread_minimum_size: int = 64 * 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.thread_minimum_size = thread_minimum_size  # 大于此大小时在线程中压缩，不阻塞事件循环
+
+    def _encoding(self, accept_encoding: str) -> str | None:
+        accepted = {e.split(";")[0].strip().lower() for e in accept_encoding.split(",")}
+        if brotli is not None and "br" in accepted:
+            return "br"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def _compress(self, body: bytes, encoding: str) -> bytes:
+        if encoding == "br":
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+
+    def _vary(self, message) -> bool:
+        """
+        响应是否可能被压缩（与请求的Accept-Encoding有关）：是则加上 Vary: Accept-Encoding，
+        包括客户端不接受压缩、或小于minimum_size原样返回的响应，避免共享缓存把一种编码的响应返回给另一类客户端
+        """
+        headers = Headers(raw=message["headers"])
+        if ("content-encoding" in headers or message["status"] in (204, 206)
+                or headers.get("content-type", "").startswith(EXCLUDED_CONTENT_TYPES)):
+            return False
+        MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+        return True
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = self._encoding(Headers(scope=scope).get("accept-encoding", ""))
+        start = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start, passthrough
+            if message["type"] == "http.response.start":
+                passthrough = not self._vary(message) or encoding is None or message["status"] == 304
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message  # 等看到响应体再决定是否压缩
+                return
+            if passthrough or message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            passthrough = True  # 只处理第一段响应体
+            body = message.get("body", b"")
+            if message.get("more_body", False) or len(body) < self.minimum_size:
+                await send(start)
+                await send(message)
+                return
+            if len(body) >= self.thread_minimum_size:
+                compressed = await anyio.to_thread.run_sync(self._compress, body, encoding)
+            else:
+                compressed = self._compress(body, encoding)
+            headers = MutableHeaders(scope=start)
+            headers["Content-Encoding"] = encoding
+            headers["Content-Length"] = str(len(compressed))
+            await send(start)
+            await send({"type": "http.response.body", "body": compressed})
+
+        await self.app(scope, receive, send_compressed)
+
+def etag(*parts) -> str:
+    """
+    由各部分（如NOWDATE、数据集版本、请求参数）生成ETag；用弱ETag，压缩前后的响应视为相同
+    """
+    digest = hashlib.sha1("\x1f".join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    return f'W/"{digest[:20]}"'
+
+def not_modified(headers, tag: str) -> bool:
+    """
+    请求的If-None-Match是否与ETag匹配（弱比较）
+    """
+    if_none_match = headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    tags = [t.strip() for t in if_none_match.split(",")]
+    return "*" in tags or tag.removeprefix("W/") in [t.removeprefix("W/") for t in tags]